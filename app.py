@@ -1,5 +1,10 @@
 import streamlit as st
-import pickle
+import hashlib
+import io
+import os
+import threading
+import uuid
+from collections import OrderedDict
 import numpy as np
 import pandas as pd
 import datetime
@@ -7,36 +12,79 @@ from scipy.stats import percentileofscore
 import matplotlib.pyplot as plt
 import seaborn as sns
 import altair as alt
+from markets import MARKET_COLUMN, MarketCache, load_market, load_registry
+from audit_log import AuditLog
+from batch_scoring import ERRORS_COLUMN, PREDICTION_COLUMN, count_rows, percentile_table, score_csv
+from thread_budget import InferenceBusy, ThreadBudget, set_thread_count
+from validation import APP_SCHEMA, HOUSE_STYLE_TO_SUBCLASS, select_rules, validate
+from incremental import build_encoder
+from renovation import COST_LABELS, DEFAULT_COSTS, optimize
+from timeline import value_over_years, year_percentiles
+from data_cache import load_cached_data
+from profiling import ACTIVE_KEY, ProfileBudget, start_rerun_profile
 
 st.set_page_config(layout="wide")
-# Load the trained stacking regressor model from the pickle file
+
+# Shared inference pool: bounds the threads used by all sessions together
 @st.cache_resource
-def load_model():
-    with open('xgboost_model.pkl', 'rb') as f:
-        return pickle.load(f)
+def load_thread_budget():
+    return ThreadBudget()
 
-stack_model = load_model()
+thread_budget = load_thread_budget()
 
-# Load the preprocessing pipeline
+# On-demand profiling (see profiling.py); None unless this rerun was requested
 @st.cache_resource
-def load_pipeline():
-    with open('preprocessing_pipeline1.pkl', 'rb') as f:
-        return pickle.load(f)
+def load_profile_budget():
+    return ProfileBudget()
 
-pipeline = load_pipeline()
+profiler = start_rerun_profile(st.session_state, st.query_params, load_profile_budget())
 
-# Load the expected feature names
-@st.cache_data
-def load_expected_features():
-    with open('expected_features1.pkl', 'rb') as f:
-        return pickle.load(f)
+def run_inference(fn, *args):
+    # Inference calls of a profiled rerun are profiled in the pool thread too
+    if profiler is not None:
+        fn = profiler.wrap(fn)
+    return thread_budget.run(fn, *args)
 
-expected_features = load_expected_features()
+# Markets (markets.json): each market's model, pipeline and reference sales are loaded on first use and
+# kept in a memory-bounded LRU cache (see markets.py). Each model is watched and reloaded in the background
+# when its files are replaced (see hot_reload.py). HOUSEPRICE_MODEL_STORE attaches the default market to a
+# shared-memory model store instead (see model_store.py).
+@st.cache_resource
+def load_market_cache():
+    markets, default_market = load_registry()
+    store_dir = os.environ.get("HOUSEPRICE_MODEL_STORE")
+    if store_dir:
+        markets[default_market] = markets[default_market]._replace(store=store_dir)
+    # The ColumnTransformer was saved with n_jobs=-1; every call stays within the thread budget
+    prepare = lambda obj: set_thread_count(obj, thread_budget.threads_per_call)
+    max_bytes = int(float(os.environ.get("HOUSEPRICE_MARKET_CACHE_MB", 2048)) * 2**20)
+    return MarketCache(markets, lambda market: load_market(market, prepare), max_bytes), default_market
+
+market_cache, default_market = load_market_cache()
+
+# Route the session to its market (?market=<id> links straight to one)
+market_ids = list(market_cache.markets)
+requested_market = st.query_params.get("market", default_market)
+market_index = market_ids.index(requested_market) if requested_market in market_ids else market_ids.index(default_market)
+if len(market_ids) > 1:
+    market_id = st.selectbox("Market", market_ids, index=market_index, format_func=lambda m: market_cache.markets[m].name)
+else:
+    market_id = market_ids[market_index]
+market_entry = market_cache.get(market_id)
+market = market_entry.market
+model_watcher = market_entry.watcher
+
+# One snapshot per rerun: a reload during this rerun doesn't change the model it uses
+model_bundle = model_watcher.current()
+stack_model = model_bundle.model
+pipeline = model_bundle.pipeline
+expected_features = model_bundle.expected_features
+model_version = model_bundle.version
 
 
 # Streamlit UI
 
-st.title("🏡 Real Estate House Price Prediction in Ames, Iowa")
+st.title(f"🏡 Real Estate House Price Prediction in {market.name}")
 
 webcol1, webcol2 = st.columns([2, 1])
 # Create a placeholder for the predicted price at the top of the app
@@ -46,7 +94,7 @@ webcol1, webcol2 = st.columns([2, 1])
     # HouseRemodelAge = YrSold - YearRemodAdd
 # MSSubClass, MSZoning, Neighborhood, HouseStyle, OverallQual, OverallCond, Functional
 with webcol1:
-    tab1, tab2, tab3, tab4 = st.tabs(["🏠 Property Details",  "🚗 Garage & Basement", "🔥 Interior & Features", "📏 Additional Space"])
+    tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs(["🏠 Property Details",  "🚗 Garage & Basement", "🔥 Interior & Features", "📏 Additional Space", "📂 Portfolio", "🛠️ Renovation", "📈 Timeline"])
     with tab1:
 
         st.subheader("Property Type & Location", anchor=False)
@@ -61,19 +109,6 @@ with webcol1:
             "SFoyer": "Split Foyer",
             "SLvl": "Split Level"
         }
-        # Mapping of MSSubClass to valid HouseStyles
-        # Allowed MSSubClass per HouseStyle
-        house_style_to_subclass = {
-            "1Story": [20, 30, 40, 90, 120, 190],
-            "1.5Fin": [30, 50, 90, 190],
-            "1.5Unf": [30, 45, 190],
-            "2Story": [20, 50, 60, 70, 75, 90, 160, 190],
-            "2.5Fin": [70, 75, 190],
-            "2.5Unf": [75, 190],
-            "SFoyer": [85, 90, 120, 180],
-            "SLvl": [20, 60, 80, 90, 180, 190]
-        }
-        
         ms_subclass_mapping = {
             20: "1-Story (Modern)",
             30: "1-Story (Old, Pre-1946)",
@@ -113,7 +148,7 @@ with webcol1:
             
         with col2:                                                  
             # Filter valid house styles based on selected MSSubClass
-            allowed_subclass_values = house_style_to_subclass.get(house_style, [])
+            allowed_subclass_values = HOUSE_STYLE_TO_SUBCLASS.get(house_style, [])
             allowed_subclass_labels = [ms_subclass_mapping[val] for val in allowed_subclass_values]
 
             # Get the default MSSubClass for the selected HouseStyle
@@ -143,36 +178,10 @@ with webcol1:
             MSZoning = mszoning_values[mszoning_labels.index(selected_MSZoning)]
         
         with col3:
-            neighborhood_mapping = {
-                "Blmngtn":"Bloomington Heights",
-                "Blueste": "Bluestem",
-                "BrDale": "Briardale",
-                "BrkSide": "Brookside",
-                "ClearCr": "Clear Creek",
-                "CollgCr": "College Creek",
-                "Crawfor": "Crawford",
-                "Edwards": "Edwards",
-                "Gilbert": "Gilbert",
-                "IDOTRR": "Iowa DOT and Rail Road",
-                "MeadowV": "Meadow Village",
-                "Mitchel": "Mitchell",
-                "NAmes": "North Ames",
-                "NoRidge": "Northridge",
-                "NPkVill": "Northpark Villa",
-                "NridgHt": "Northridge Heights",
-                "NWAmes": "Northwest Ames",
-                "OldTown": "Old Town",
-                "SWISU": "South & West of Iowa State University",
-                "Sawyer": "Sawyer",
-                "SawyerW": "Sawyer West",
-                "Somerst": "Somerset",
-                "StoneBr": "Stone Brook",
-                "Timber": "Timberland",
-                "Veenker": "Veenker"
-            }
+            neighborhood_mapping = market.neighborhoods
             neighborhood_values = list(neighborhood_mapping.keys())
             neighborhood_labels = list(neighborhood_mapping.values())
-            neighborhood_default_index = neighborhood_labels.index("North Ames")
+            neighborhood_default_index = neighborhood_values.index(market.default_neighborhood)
             selected_neighborhood = st.selectbox("Select Neighborhood", neighborhood_labels, index=neighborhood_default_index)
             Neighborhood = neighborhood_values[neighborhood_labels.index(selected_neighborhood)]
         
@@ -326,7 +335,8 @@ with webcol1:
             st.write(f"House Age: {HouseAge} years")
         #Streamlit input for year remodeling age and calculate for HouseRemodelAge
         with col10:
-            yearRemodAdd = st.number_input("Year of Remodeling", 1800, current_year, 1994)
+            # A house cannot be remodeled before it was built (no remodel = the year built, as in the Kaggle data)
+            yearRemodAdd = st.number_input("Year of Remodeling", yearBuilt, current_year, max(1994, yearBuilt))
             HouseRemodelAge = current_year - yearRemodAdd
             st.write(f"House Remodeling Age: {HouseRemodelAge} years")
 
@@ -377,10 +387,9 @@ with webcol1:
             BsmtQual = bsmtqual_values[bsmtqual_labels.index(selected_bsmtqual)]
 
             # Display a warning if the selection is invalid
-            if TotalBsmtSF == 0 and BsmtQual != "NA":
-                st.warning("You cannot select a basement height when there is no basement. Please select 'No Basement'.")
-            elif TotalBsmtSF > 0 and BsmtQual == "NA":
-                st.warning("You cannot select 'No Basement' when there is a basement. Please choose a valid basement height.")
+            basement_check = validate(pd.DataFrame([{"TotalBsmtSF": TotalBsmtSF, "BsmtQual": BsmtQual}]))
+            if not basement_check.valid[0]:
+                st.warning(basement_check.reasons()[0])
 
         with bscol2:
             BsmtFinSF = st.slider("Finished Area", 0, TotalBsmtSF, min(1000, TotalBsmtSF), help="Square Feet")
@@ -660,7 +669,8 @@ with webcol1:
 
         with hcol3:
             air_option = st.radio("Central Air Conditioning?", ["Yes", "No"], index=1)
-            CentralAir = 1 if air_option == "Yes" else 0
+            # Encoded as in the Kaggle data (the pipeline knows "Y" and "N" only)
+            CentralAir = "Y" if air_option == "Yes" else "N"
 
         st.subheader('Fireplace', divider="red", anchor=False)
         fcol1, fcol2 = st.columns(2)
@@ -865,22 +875,75 @@ user_input.update({
 
 })
 
-# Convert user input to DataFrame
-user_input_df = pd.DataFrame([user_input])
-# Apply preprocessing to handle categorical encoding
-processed_features = pipeline.transform(user_input_df)
-#st.write(user_input_df)
-#st.write(processed_features)
+# Check the raw inputs (original column names) against the same schema used for batch scoring
+raw_input = {
+    "MSSubClass": ms_subclass, "HouseStyle": house_style, "MSZoning": MSZoning,
+    "GrLivArea": GrLivArea, "1stFlrSF": FirstFlrSF, "2ndFlrSF": SecondFlrSF,
+    "TotalBsmtSF": TotalBsmtSF, "BsmtFinSF1": BsmtFinSF, "BsmtFinSF2": 0, "BsmtUnfSF": BsmtUnfSF,
+    "BsmtQual": BsmtQual, "BsmtExposure": BsmtExposure, "BsmtFinType1": BsmtFinType1,
+    "FullBath": FullBath, "HalfBath": HalfBath, "BsmtFullBath": BsmtFullBath, "BsmtHalfBath": BsmtHalfBath,
+    "OverallQual": OverallQual, "OverallCond": OverallCond, "YearBuilt": yearBuilt, "YearRemodAdd": yearRemodAdd,
+    "GarageFinish": GarageFinish, "GarageCars": GarageCars, "Fireplaces": Fireplaces, "FireplaceQu": FireplaceQu,
+    "BedroomAbvGr": BedroomAbvGr, "TotRmsAbvGrd": TotRmsAbvGrd, "KitchenAbvGr": KitchenAbvGr,
+    "KitchenQual": KitchenQual, "ExterQual": ExterQual, "HeatingQC": HeatingQC, "Heating": Heating,
+    "CentralAir": CentralAir, "Functional": Functional, "MasVnrType": MasVnrType, "MasVnrArea": MasVnrArea,
+    "LotFrontage": LotFrontage, "LotArea": LotArea, "PoolArea": PoolArea,
+    "WoodDeckSF": WoodDeckSF, "OpenPorchSF": OpenPorchSF, "EnclosedPorch": EnclosedPorch,
+    "3SsnPorch": ThreeSsnPorch, "ScreenPorch": ScreenPorch,
+}
+# The last input of this session passed every rule, so only the rules reading a changed input run again
+last_raw_input = st.session_state.get("last_raw_input")
+if last_raw_input is None:
+    input_rules = APP_SCHEMA
+else:
+    input_rules = select_rules([name for name, value in raw_input.items() if last_raw_input.get(name) != value], APP_SCHEMA)
+# Invalid inputs only skip the valuation of this house; the portfolio still works
+input_valid = True
+if input_rules:
+    input_check = validate(pd.DataFrame([raw_input]), input_rules)
+    if not input_check.valid[0]:
+        for reason in input_check.reasons()[0].split("; "):
+            st.error(reason)
+        input_valid = False
+if input_valid:
+    st.session_state.last_raw_input = raw_input
+
+def predict_prices(df):
+    # Apply preprocessing to handle categorical encoding, then predict
+    return stack_model.predict(pipeline.transform(df))
+
+# Pipeline output vector of the input, updated in place of a full transform (see incremental.py)
+@st.cache_resource(max_entries=8)
+def load_feature_encoder(_pipeline, _expected_features, model_version):
+    return build_encoder(_pipeline, _expected_features)
+
+feature_encoder = load_feature_encoder(pipeline, expected_features, model_version)
+predicted_price = None
+if input_valid:
+    last_features = st.session_state.get("feature_vector")
+    if feature_encoder is None:
+        # Full transform: convert user input to DataFrame
+        predict_fn, model_input = predict_prices, pd.DataFrame([user_input])
+    else:
+        if last_features is not None and last_features["model_version"] == model_version:
+            # Only the slots of the features that changed since the last rerun are encoded again
+            feature_vector, _ = feature_encoder.update_vector(last_features["vector"], last_features["inputs"], user_input)
+        else:
+            feature_vector = feature_encoder.transform_row(user_input)
+        st.session_state.feature_vector = {"model_version": model_version, "inputs": user_input, "vector": feature_vector}
+        predict_fn, model_input = stack_model.predict, feature_vector
 
+    # Runs on the shared inference pool
+    try:
+        predicted_price = run_inference(predict_fn, model_input)
+    except InferenceBusy as e:
+        st.error(str(e))
+#st.write(user_input)
 
-# === Load Data ===
-@st.cache_data
-def load_data():
-    # Load only the price column for comparison
-    data = pd.read_csv("train.csv", usecols=["SalePrice"])
-    return data
 
-data = load_data()
+# === Load Data ===
+# Sale prices of the market for comparison (memory mapped from the compact cache of its reference data)
+data = market_entry.reference_data
 
 # === Generate Predicted Prices ===
 if "predicted_prices" not in st.session_state:
@@ -891,17 +954,21 @@ if "predicted_prices" not in st.session_state:
 predicted_prices = st.session_state.predicted_prices
 
 # === Price Ranking ===
-def rank_house_price(predicted_price, actual_prices):
+def house_price_percentile(predicted_price, actual_prices):
     """
-    Ranks the predicted price by displaying its exact percentile.
+    Returns the exact percentile of the predicted price among the actual prices.
     """
     # Ensure predicted_price is a scalar
     if isinstance(predicted_price, (np.ndarray, list)):
         predicted_price = predicted_price[0]  # Extract the first element if it's an array
 
-    # Calculate percentile
-    percentile = percentileofscore(actual_prices, predicted_price, kind="weak")
-    return f"📊 The price of the house is in the **{percentile:.2f}th percentile** of Ames, Iowa homes."
+    return percentileofscore(actual_prices, predicted_price, kind="weak")
+
+def rank_house_price(percentile):
+    """
+    Ranks the predicted price by displaying its exact percentile.
+    """
+    return f"📊 The price of the house is in the **{percentile:.2f}th percentile** of {market.name} homes."
 
 def plot_price_distribution(actual_prices, user_price):
     """
@@ -926,21 +993,289 @@ with webcol2:
     webtab1 = st.tabs(["🥇 Price Ranking"])[0]
     with webtab1:
         st.write("Enter house details to estimate the price.")
-        
-        # Predict the price (returns an array)
-        predicted_price = stack_model.predict(processed_features) 
+        if predicted_price is None:
+            st.info("No estimate: fix the inputs above." if not input_valid else "No estimate: the model is busy, try again.")
+        else:
+            # Ensure predicted_price is a scalar
+            if isinstance(predicted_price, (np.ndarray, list)):
+                predicted_price = predicted_price[0]  # Extract the first element if it's an array
+
+            # Display the predicted price
+            st.success(f"💰 The estimated house price is **${predicted_price:,.2f}**")
 
-        # Ensure predicted_price is a scalar
-        if isinstance(predicted_price, (np.ndarray, list)):
-            predicted_price = predicted_price[0]  # Extract the first element if it's an array
+            # Rank the house by percentile
+            percentile = house_price_percentile(predicted_price, data["SalePrice"])
+            rank = rank_house_price(percentile)
+            st.success(rank)
 
-        # Display the predicted price
-        st.success(f"💰 The estimated house price is **${predicted_price:,.2f}**")
+            # Plot the price distribution
+            plt = plot_price_distribution(data["SalePrice"], predicted_price)
+            st.pyplot(plt)
 
-        # Rank the house by percentile
-        rank = rank_house_price(predicted_price, data["SalePrice"])
-        st.success(rank)
+# === Audit Log ===
+# Every valuation is queued for the background writer; a single valuation never waits on disk
+@st.cache_resource
+def load_audit_log():
+    return AuditLog(os.environ.get("HOUSEPRICE_AUDIT_DIR", "audit_log"))
+
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+
+audit_log = load_audit_log()
+# Recorded once per valuation, not again on reruns that leave the house and the model unchanged
+audit_key = (market_id, model_version, tuple(user_input.items()))
+if predicted_price is not None and st.session_state.get("last_audited") != audit_key:
+    audit_log.record({
+        "session_id": st.session_state.session_id,
+        "source": "house",
+        "market": market_id,
+        "model_version": model_version,
+        "predicted_price": float(predicted_price),
+        "percentile": float(percentile),
+        **{f"input_{feature}": value for feature, value in user_input.items()},
+    })
+    st.session_state.last_audited = audit_key
+
+with webcol2:
+    with st.expander("⚙️ Inference Queue"):
+        budget_stats = thread_budget.stats()
+        qcol1, qcol2, qcol3 = st.columns(3)
+        qcol1.metric("Queue Depth", budget_stats["queue_depth"])
+        qcol2.metric("Mean Wait", f"{budget_stats['mean_wait_ms']:.1f} ms")
+        qcol3.metric("p95 Wait", f"{budget_stats['p95_wait_ms']:.1f} ms")
+        st.caption(f"{budget_stats['workers']} workers x {budget_stats['threads_per_call']} thread(s), "
+                   f"{budget_stats['rejected']} request(s) rejected")
+        audit_stats = audit_log.stats()
+        st.caption(f"Audit log: {audit_stats['written']:,} valuations written, {audit_stats['queued']} queued, "
+                   f"{audit_stats['dropped']} dropped, {audit_stats['failed']} failed")
+        if audit_stats["last_error"]:
+            st.caption(f"Last audit write error: {audit_stats['last_error']}")
+        watcher_stats = model_watcher.stats()
+        loaded_at = datetime.datetime.fromtimestamp(model_bundle.loaded_at).strftime("%Y-%m-%d %H:%M:%S")
+        st.caption(f"Model version {model_version} (loaded {loaded_at}), {watcher_stats['reloads']} reload(s), "
+                   f"{watcher_stats['rejected']} rejected")
+        if watcher_stats["last_error"]:
+            st.caption(f"Last rejected model: {watcher_stats['last_error']}")
+        market_stats = market_cache.stats()
+        st.caption(f"Markets loaded: {', '.join(market_stats['loaded'])} "
+                   f"({market_stats['used_bytes'] / 2**20:,.1f} of {market_stats['max_bytes'] / 2**20:,.0f} MB), "
+                   f"{market_stats['evictions']} eviction(s), {market_stats['prefetches']} prefetch(es)")
+
+
+# === Portfolio Valuation ===
+# Uploaded CSVs are scored in chunks; results are shared by all sessions and keyed by the file content hash.
+# The cache is bounded by the size of the results (the result CSV dominates), least recently used first out
+PORTFOLIO_CACHE_BYTES = int(float(os.environ.get("HOUSEPRICE_PORTFOLIO_CACHE_MB", 256)) * 2**20)
+
+@st.cache_resource
+def load_portfolio_cache():
+    return {"lock": threading.Lock(), "results": OrderedDict()}
 
-        # Plot the price distribution
-        plt = plot_price_distribution(data["SalePrice"], predicted_price)
-        st.pyplot(plt)
+def upload_hash(uploaded_file):
+    """
+    SHA-256 of an upload, computed once per uploaded file (not on every rerun).
+    """
+    hashes = st.session_state.setdefault("upload_hashes", {})
+    if uploaded_file.file_id not in hashes:
+        hashes.clear()
+        hashes[uploaded_file.file_id] = hashlib.sha256(uploaded_file.getvalue()).hexdigest()
+    return hashes[uploaded_file.file_id]
+
+def score_portfolio(file_bytes, file_hash, chunksize):
+    """
+    Scores an uploaded CSV chunk by chunk with a progress bar, or returns the cached result of the same file.
+    Results are keyed by market and model version too, and results of other versions of the market
+    are dropped after a reload.
+    Rows with a Market column are scored by their market's model, the other rows by the selected market.
+    Every row scored is recorded in the audit log (rows that failed validation with their reasons).
+    """
+    key = (market_id, model_version, file_hash)
+    cache = load_portfolio_cache()
+    with cache["lock"]:
+        for old_key in [k for k in cache["results"] if k[0] == market_id and k[1] != model_version]:
+            del cache["results"][old_key]
+        if key in cache["results"]:
+            cache["results"].move_to_end(key)
+            return cache["results"][key]
+
+    total_rows = count_rows(file_bytes)
+    progress_bar = st.progress(0.0, text="Scoring listings...")
+
+    def update_progress(rows_done):
+        progress_bar.progress(min(rows_done / max(total_rows, 1), 1.0), text=f"Scored {rows_done:,} of {total_rows:,} listings")
+
+    versions = {market_id: model_version}
+
+    def route(row_market):
+        bundle = market_cache.get(row_market).watcher.current()
+        versions[row_market] = bundle.version
+        return bundle.pipeline, bundle.model, bundle.expected_features
+
+    def audit_chunk(chunk):
+        inputs = chunk.drop(columns=[PREDICTION_COLUMN, ERRORS_COLUMN], errors="ignore")
+        records = inputs.astype(object).where(inputs.notna(), None).rename(columns=lambda column: f"input_{column}").to_dict("records")
+        row_markets = chunk[MARKET_COLUMN].fillna("").astype(str) if MARKET_COLUMN in chunk.columns else pd.Series("", index=chunk.index)
+        errors = chunk[ERRORS_COLUMN] if ERRORS_COLUMN in chunk.columns else pd.Series("", index=chunk.index)
+        for record, price, row_market, reasons in zip(records, chunk[PREDICTION_COLUMN], row_markets, errors):
+            row_market = row_market or market_id
+            record.update({
+                "session_id": st.session_state.session_id,
+                "source": "portfolio",
+                "upload": file_hash,
+                "market": row_market,
+                "model_version": versions.get(row_market),
+                "predicted_price": None if np.isnan(price) else float(price),
+                "validation_errors": reasons or None,
+            })
+        # Waits for room in the queue rather than dropping rows of the upload
+        audit_log.record_many(records)
+
+    output = io.StringIO()
+    try:
+        predictions, by_neighborhood = score_csv(io.BytesIO(file_bytes), output, pipeline, stack_model,
+                                                 expected_features, chunksize, update_progress, run=run_inference,
+                                                 route=route, on_scored=audit_chunk)
+    finally:
+        progress_bar.empty()
+
+    result = {
+        "predictions": predictions,
+        "by_neighborhood": by_neighborhood,
+        "csv": output.getvalue().encode(),
+    }
+    result["size"] = len(result["csv"]) + predictions.nbytes + int(by_neighborhood.memory_usage(deep=True).sum())
+    with cache["lock"]:
+        cache["results"][key] = result
+        # The newest result is always kept, even when it alone is over the bound
+        used = sum(cached["size"] for cached in cache["results"].values())
+        while used > PORTFOLIO_CACHE_BYTES and len(cache["results"]) > 1:
+            _, evicted = cache["results"].popitem(last=False)
+            used -= evicted["size"]
+    return result
+
+with tab5:
+    st.subheader("Portfolio Valuation", anchor=False)
+    st.write("Upload a CSV of listings, either in the `train.csv` format or with the model features as columns. "
+             "An optional `Market` column scores each row with its market's model.")
+    uploaded_file = st.file_uploader("Listings (CSV)", type="csv")
+    chunksize = st.select_slider("Rows per chunk", options=[10000, 25000, 50000, 100000], value=50000)
+
+    if uploaded_file is not None:
+        try:
+            result = score_portfolio(uploaded_file.getvalue(), upload_hash(uploaded_file), chunksize)
+        except InferenceBusy as e:
+            st.error(str(e))
+        else:
+            # Rows that failed validation have no price
+            invalid_rows = int(np.isnan(result["predictions"]).sum())
+            predictions = result["predictions"][~np.isnan(result["predictions"])]
+
+            pcol1, pcol2, pcol3, pcol4 = st.columns(4)
+            pcol1.metric("Listings", f"{len(predictions):,}")
+            pcol2.metric("Total Value", f"${predictions.sum():,.0f}")
+            pcol3.metric("Median Price", f"${np.median(predictions):,.0f}" if len(predictions) else "-")
+            pcol4.metric("Invalid Rows", f"{invalid_rows:,}", help="Not scored, see the ValidationErrors column of the download")
+
+            st.subheader("Per Neighborhood", anchor=False)
+            st.dataframe(result["by_neighborhood"].style.format({"TotalPrice": "${:,.0f}", "MeanPrice": "${:,.0f}"}))
+
+            st.subheader("Price Distribution", anchor=False)
+            dcol1, dcol2 = st.columns([1, 2])
+            with dcol1:
+                st.dataframe(percentile_table(predictions).style.format({"PredictedPrice": "${:,.0f}"}), hide_index=True)
+            with dcol2:
+                # Histogram from pre-binned counts so large portfolios don't send every point to the browser
+                counts, edges = np.histogram(predictions, bins=50)
+                hist = pd.DataFrame({"Price": edges[:-1], "Listings": counts})
+                st.altair_chart(alt.Chart(hist).mark_bar().encode(x=alt.X("Price:Q", title="Predicted Price ($)"), y="Listings:Q"))
+
+            st.download_button("Download Results", result["csv"], file_name="portfolio_valuation.csv", mime="text/csv")
+
+
+# === Renovation Planner ===
+with tab6:
+    st.subheader("Renovation Planner", anchor=False)
+    st.write("Finds the upgrades that add the most value per dollar to the house described in the other tabs.")
+    if feature_encoder is None:
+        st.info("The renovation planner is not available for this model's preprocessing pipeline.")
+    elif not input_valid:
+        st.info("Fix the inputs above to plan renovations.")
+    else:
+        with st.expander("Upgrade Costs ($)"):
+            cost_columns = st.columns(3)
+            renovation_costs = {
+                name: cost_columns[i % 3].number_input(COST_LABELS[name], min_value=0, value=default, step=100 if default < 1000 else 1000)
+                for i, (name, default) in enumerate(DEFAULT_COSTS.items())
+            }
+        renovation_budget = st.number_input("Budget ($, 0 = no limit)", min_value=0, value=0, step=5000)
+
+        # The search runs on demand and its result is kept until the house, costs or model change
+        renovation_key = (model_version, tuple(user_input.items()), tuple(renovation_costs.items()), renovation_budget)
+        if st.button("Find Best Upgrades"):
+            try:
+                st.session_state.renovation = (renovation_key, run_inference(
+                    optimize, user_input, stack_model.predict, feature_encoder, renovation_costs, renovation_budget or None))
+            except InferenceBusy as e:
+                st.error(str(e))
+
+        renovation = st.session_state.get("renovation")
+        if renovation is not None and renovation[0] == renovation_key:
+            plans, renovation_stats = renovation[1]
+            st.caption(f"Current price ${renovation_stats['base_price']:,.0f}. "
+                       f"{renovation_stats['scored']:,} of {renovation_stats['search_space']:,} possible plans scored.")
+            if plans.empty:
+                st.info("No upgrade within the budget raises the predicted price.")
+            else:
+                st.dataframe(plans.style.format({"Cost": "${:,.0f}", "Gain": "${:,.0f}", "GainPerDollar": "{:.2f}", "Price": "${:,.0f}"}),
+                             hide_index=True)
+        elif renovation is not None:
+            st.caption("The house or the costs changed. Run the search again.")
+
+
+# === Valuation Timeline ===
+# All sale years of the house are valued in one batched predict; results are cached per house, market and model version
+@st.cache_data(max_entries=256)
+def value_timeline(inputs, market_id, model_version, first_year, last_year):
+    years = np.arange(first_year, last_year + 1)
+    prices = run_inference(value_over_years, pd.DataFrame([dict(inputs)]), pipeline, stack_model, years, current_year)
+    return pd.DataFrame({"Year": years, "PredictedPrice": prices[0]})
+
+@st.cache_data
+def load_sales_by_year(reference_data):
+    return load_cached_data(reference_data, columns=["SalePrice", "YrSold"])
+
+with tab7:
+    st.subheader("Valuation Timeline", anchor=False)
+    st.write("Values the house as if it were sold in each year of the range (the house and remodel ages follow the sale year).")
+    first_year, last_year = st.slider("Sale Years", 1950, current_year + 10, (max(yearBuilt, current_year - 20), current_year))
+
+    # The valuation runs on demand (not on every rerun) and its result is kept until the house, years or model change
+    timeline_key = (market_id, model_version, tuple(user_input.items()), first_year, last_year)
+    if st.button("Value Over Years", disabled=not input_valid, help=None if input_valid else "Fix the inputs above first"):
+        try:
+            st.session_state.timeline = (timeline_key, value_timeline(tuple(user_input.items()), market_id, model_version, first_year, last_year))
+        except InferenceBusy as e:
+            st.error(str(e))
+
+    timeline_result = st.session_state.get("timeline")
+    if timeline_result is not None and timeline_result[0] == timeline_key:
+        timeline = timeline_result[1]
+        sales_by_year = load_sales_by_year(market.reference_data)
+        timeline = timeline.assign(Percentile=year_percentiles(timeline["PredictedPrice"].to_numpy(), timeline["Year"].to_numpy(), sales_by_year))
+        if timeline["PredictedPrice"].isna().all():
+            st.info("The house was not built yet in these years.")
+        else:
+            st.altair_chart(alt.Chart(timeline.dropna(subset=["PredictedPrice"])).mark_line(point=True).encode(
+                x=alt.X("Year:O", title="Sale Year"),
+                y=alt.Y("PredictedPrice:Q", title="Predicted Price ($)", scale=alt.Scale(zero=False)),
+            ))
+            st.dataframe(timeline.style.format({"PredictedPrice": "${:,.0f}", "Percentile": "{:.1f}"}, na_rep="-"), hide_index=True)
+            st.caption(f"Percentile: rank among the {market.name} sales of the same year, where the reference data has sales.")
+    elif timeline_result is not None:
+        st.caption("The house or the years changed. Run the valuation again.")
+
+
+# === Profiling ===
+if profiler is not None:
+    profiler.finish(inputs=user_input, market=market_id, model_version=model_version, session_id=st.session_state.session_id)
+    st.session_state.pop(ACTIVE_KEY, None)
@@ -0,0 +1,246 @@
+import atexit
+import glob
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# Append-only audit log of valuations.
+# The app thread only puts records on a bounded queue (never waits on disk). A background
+# writer drains the queue in batches and appends them as row groups to compressed Parquet
+# files, starting a new file after rows_per_file rows or max_file_seconds seconds. Records with
+# different columns (single valuations from the app, rows of portfolio uploads) go to different
+# files; up to max_open_files are kept open at a time.
+#
+# Full queue policy: the new record is dropped and counted (AuditLog.dropped, also stored in
+# the "dropped" column of the next batch written), so a slow disk never slows down a rerun.
+# Pass when_full="block" to wait up to block_timeout seconds for room instead. record_many()
+# (portfolio rows) always waits for room, since a whole upload would not fit in the queue.
+#
+# Records with different keys (e.g. the inputs of another market) are written as separate
+# tables, so no column is lost. A column whose type changes between batches (e.g. after a deploy)
+# goes to a new file, and read_audit_log reads such columns as text. Records that cannot be
+# converted at all (one column with values of different types in the same batch) are counted in
+# AuditLog.failed with the error in last_error; the writer keeps running.
+
+FILE_PREFIX = "audit-"
+FILE_SUFFIX = ".parquet"
+IN_PROGRESS_SUFFIX = ".inprogress"
+
+
+class AuditLog:
+    def __init__(self, directory="audit_log", max_queue=10000, batch_size=1000, flush_interval=2.0,
+                 rows_per_file=100000, max_file_seconds=3600, compression="zstd",
+                 when_full="drop", block_timeout=0.05, max_open_files=4):
+        self.directory = directory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.rows_per_file = rows_per_file
+        self.max_file_seconds = max_file_seconds
+        self.compression = compression
+        self.when_full = when_full
+        self.block_timeout = block_timeout
+        self.max_open_files = max_open_files
+
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.last_error = None
+        self._dropped_unreported = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        # Open files by schema, least recently written first: [writer, path, rows, opened]
+        self._files = OrderedDict()
+        self._file_seq = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="audit-log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def record(self, record):
+        """
+        Queues one record (a flat dict). Returns False when the record was dropped.
+        """
+        record = dict(record)
+        record.setdefault("timestamp", time.time_ns())
+        try:
+            if self.when_full == "block":
+                self._queue.put(record, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+                self._dropped_unreported += 1
+            return False
+
+    def record_many(self, records):
+        """
+        Queues every record, waiting for room when the queue is full (nothing is dropped).
+        """
+        for record in records:
+            record = dict(record)
+            record.setdefault("timestamp", time.time_ns())
+            self._queue.put(record)
+
+    def stats(self):
+        return {"queued": self._queue.qsize(), "written": self.written, "dropped": self.dropped,
+                "failed": self.failed, "last_error": self.last_error}
+
+    def close(self, timeout=10):
+        """
+        Writes the queued records and closes the open files.
+        """
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+
+    # --- background writer ---
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            try:
+                if batch:
+                    self._write(batch)
+                for schema in [schema for schema, file in self._files.items()
+                               if time.monotonic() - file[3] > self.max_file_seconds]:
+                    self._close_file(schema)
+            except Exception as e:
+                self._fail(0, e)
+        for schema in list(self._files):
+            try:
+                self._close_file(schema)
+            except Exception as e:
+                self._fail(0, e)
+
+    def _next_batch(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+            if self._stop.is_set():
+                # Shutting down: take everything that is left without waiting
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                break
+        return batch
+
+    def _write(self, batch):
+        with self._lock:
+            dropped, self._dropped_unreported = self._dropped_unreported, 0
+        for record in batch:
+            record["dropped"] = 0
+        batch[0]["dropped"] = dropped
+
+        # from_pylist takes the columns of the first record only, so every key set is its own table
+        groups = {}
+        for record in batch:
+            groups.setdefault(frozenset(record), []).append(record)
+        for records in groups.values():
+            schema = None
+            try:
+                table = pa.Table.from_pylist(records)
+                schema = table.schema
+                self._write_table(table)
+            except Exception as e:
+                self._fail(len(records), e, schema)
+
+    def _write_table(self, table):
+        schema = table.schema
+        # New file when the one of this layout is full or too old
+        file = self._files.get(schema)
+        if file is not None and (file[2] >= self.rows_per_file or time.monotonic() - file[3] > self.max_file_seconds):
+            self._close_file(schema)
+            file = None
+        if file is None:
+            while len(self._files) >= self.max_open_files:
+                self._close_file(next(iter(self._files)))
+            file = self._open_file(schema)
+
+        file[0].write_table(table)
+        file[2] += table.num_rows
+        self._files.move_to_end(schema)
+        self.written += table.num_rows
+
+    def _fail(self, n_records, error, schema=None):
+        with self._lock:
+            self.failed += n_records
+            self.last_error = f"{type(error).__name__}: {error}"
+        if schema in self._files and not isinstance(error, (pa.ArrowInvalid, pa.ArrowTypeError)):
+            # The file may be broken (e.g. a disk error): it keeps its temporary name, so readers skip
+            # it, and the next table of this layout starts a new one
+            writer = self._files.pop(schema)[0]
+            try:
+                writer.close()
+            except Exception:
+                pass
+
+    def _open_file(self, schema):
+        self._file_seq += 1
+        name = f"{FILE_PREFIX}{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self._file_seq:04d}{FILE_SUFFIX}"
+        path = os.path.join(self.directory, name)
+        # Written under a temporary name; readers only pick up closed files
+        writer = pq.ParquetWriter(path + IN_PROGRESS_SUFFIX, schema, compression=self.compression)
+        self._files[schema] = [writer, path, 0, time.monotonic()]
+        return self._files[schema]
+
+    def _close_file(self, schema):
+        writer, path, _, _ = self._files.pop(schema)
+        writer.close()
+        os.replace(path + IN_PROGRESS_SUFFIX, path)
+
+
+def audit_files(directory="audit_log"):
+    return sorted(glob.glob(os.path.join(directory, f"{FILE_PREFIX}*{FILE_SUFFIX}")))
+
+
+def _unified_schema(schemas):
+    types = {}
+    for schema in schemas:
+        for field in schema:
+            types.setdefault(field.name, []).append(field)
+    fields = []
+    for name, versions in types.items():
+        try:
+            fields.append(pa.unify_schemas([pa.schema([field]) for field in versions], promote_options="permissive").field(name))
+        except (pa.ArrowTypeError, pa.ArrowInvalid):
+            fields.append(pa.field(name, pa.string()))
+    return pa.schema(fields)
+
+
+def read_audit_log(directory="audit_log", columns=None, filter=None):
+    """
+    Reads every closed audit file into one DataFrame for offline analysis.
+    Files written with different input columns are merged (missing values are null). A column
+    written with incompatible types in different files (e.g. 0/1 in some, "Y"/"N" in others) is read as text.
+    filter is an optional pyarrow expression, e.g. pyarrow.dataset.field("model_version") == "abc".
+    """
+    files = audit_files(directory)
+    if not files:
+        return pa.table({}).to_pandas()
+    schema = _unified_schema([pq.read_schema(path) for path in files])
+    dataset = ds.dataset(files, schema=schema, format="parquet")
+    table = dataset.to_table(columns=columns, filter=filter)
+    df = table.to_pandas()
+    if "timestamp" in df.columns:
+        df["timestamp"] = df["timestamp"].astype("datetime64[ns]")
+    return df
@@ -0,0 +1,246 @@
+import argparse
+import datetime
+import pickle
+import sys
+
+import numpy as np
+import pandas as pd
+
+from features import engineer_features
+from markets import MARKET_COLUMN, MarketCache, load_market, load_registry
+from sparse_batch import build_sparse_encoder
+from timeline import parse_years, value_over_years
+from validation import validate
+
+# Batch scoring of listing files: the rows are read in chunks and every chunk goes through
+# the preprocessing pipeline and the model in a single vectorized call.
+# With sparse, the pipeline output is built as float32 CSR (see sparse_batch) for models where
+# that gives the same predictions.
+
+# Original Kaggle columns needed to compute the engineered features
+RAW_COLUMNS = [
+    "YearBuilt", "YearRemodAdd", "BsmtFullBath", "FullBath", "HalfBath", "BsmtHalfBath", "PoolArea",
+    "OpenPorchSF", "EnclosedPorch", "3SsnPorch", "ScreenPorch", "WoodDeckSF", "1stFlrSF", "2ndFlrSF",
+    "BsmtFinSF1", "BsmtFinSF2", "GrLivArea", "TotalBsmtSF",
+]
+
+PREDICTION_COLUMN = "PredictedPrice"
+ERRORS_COLUMN = "ValidationErrors"
+PERCENTILES = [1, 5, 10, 25, 50, 75, 90, 95, 99]
+
+
+def prepare_batch(df, expected_features):
+    """
+    Builds the model input frame from uploaded rows.
+    Rows may use the original Kaggle columns (train.csv format) or already hold the engineered features.
+    Features that are still missing are set to 0, like the app does.
+    """
+    if all(col in df.columns for col in RAW_COLUMNS):
+        df = df.copy()
+        if "YrSold" not in df.columns:
+            # Value the houses as of today, like the app
+            df["YrSold"] = datetime.datetime.now().year
+        df = engineer_features(df)
+    X = df.reindex(columns=list(expected_features), fill_value=0)
+    return X
+
+
+def score_frame(df, pipeline, model, expected_features, sparse_encoder=None):
+    """
+    Returns the predicted prices of every row of df.
+    sparse_encoder (a sparse_batch.SparseBatchEncoder) replaces pipeline.transform when given.
+    """
+    X = prepare_batch(df, expected_features)
+    transformer = pipeline if sparse_encoder is None else sparse_encoder
+    return np.asarray(model.predict(transformer.transform(X)), dtype=np.float64)
+
+
+def sale_years(df):
+    """
+    The year each row is valued as of by score_frame: its YrSold, or the current year.
+    """
+    current_year = datetime.datetime.now().year
+    if "YrSold" in df.columns:
+        return df["YrSold"].fillna(current_year).to_numpy()
+    return current_year
+
+
+def score_years(df, pipeline, model, expected_features, years, sparse_encoder=None):
+    """
+    Predicted prices of every row of df in every sale year, shape (len(df), len(years)), in one predict.
+    """
+    X = prepare_batch(df, expected_features)
+    transformer = pipeline if sparse_encoder is None else sparse_encoder
+    return value_over_years(X, transformer, model, years, sale_years(df))
+
+
+def count_rows(data):
+    """
+    Number of data rows in CSV bytes (used for the progress bar).
+    """
+    lines = data.count(b"\n")
+    if data and not data.endswith(b"\n"):
+        lines += 1
+    return max(lines - 1, 0)
+
+
+def score_csv(source, output, pipeline, model, expected_features, chunksize=50000, progress=None, run=None,
+              check_rows=True, route=None, years=None, sparse=False, on_scored=None):
+    """
+    Streams the CSV source in chunks and writes every row plus its PredictedPrice to output.
+    progress(rows_done) is called after every chunk.
+    run(fn, *args), e.g. ThreadBudget.run, executes the scoring of each chunk when given.
+    With check_rows, every chunk is validated first: rows that break the input schema are not scored,
+    get an empty PredictedPrice and the reasons in ValidationErrors.
+    route(market_id) returns the (pipeline, model, expected_features) of a market and raises KeyError for
+    unknown markets. When given, rows with a Market value are scored by that market's model;
+    rows without one use pipeline and model.
+    With years, every row is also valued as if sold in each of those years (PredictedPrice_<year> columns).
+    With sparse, models that support it are fed float32 CSR instead of the dense pipeline output.
+    on_scored(chunk) is called with every scored chunk (e.g. to audit the valuations) before it is written.
+    Returns (predictions, by_neighborhood) where predictions is NaN for the invalid rows
+    and by_neighborhood holds count, total and mean price of the scored rows.
+    """
+    predictions = []
+    totals = {}
+    rows_done = 0
+    # Sparse encoder per model (None when the model needs the dense output); the model is kept
+    # in the entry so its id is not reused while the entry exists
+    encoders = {}
+    for i, chunk in enumerate(pd.read_csv(source, chunksize=chunksize)):
+        prices = np.full(len(chunk), np.nan)
+        year_prices = np.full((len(chunk), len(years or [])), np.nan)
+        if check_rows:
+            result = validate(chunk)
+            valid = result.valid
+            chunk[ERRORS_COLUMN] = result.reasons().to_numpy()
+        else:
+            valid = np.ones(len(chunk), dtype=bool)
+
+        # One group of rows per market (a single group without routing)
+        if route is not None and MARKET_COLUMN in chunk.columns:
+            markets = chunk[MARKET_COLUMN].to_numpy(dtype=object)
+            groups = pd.Series(np.arange(len(chunk))).groupby(pd.Series(markets).fillna(""))
+            groups = [(market, positions.to_numpy()) for market, positions in groups]
+        else:
+            groups = [("", np.arange(len(chunk)))]
+        for market, positions in groups:
+            try:
+                bundle = (pipeline, model, expected_features) if market == "" else route(str(market))
+            except KeyError as e:
+                if ERRORS_COLUMN not in chunk.columns:
+                    chunk[ERRORS_COLUMN] = ""
+                errors = chunk[ERRORS_COLUMN].iloc[positions].to_numpy(dtype=object)
+                chunk.iloc[positions, chunk.columns.get_loc(ERRORS_COLUMN)] = [
+                    f"{error}; {e.args[0]}" if error else e.args[0] for error in errors
+                ]
+                valid[positions] = False
+                continue
+            sparse_encoder = None
+            if sparse:
+                if id(bundle[1]) not in encoders:
+                    encoders[id(bundle[1])] = (bundle[1], build_sparse_encoder(bundle[0], bundle[1]))
+                sparse_encoder = encoders[id(bundle[1])][1]
+            positions = positions[valid[positions]]
+            if len(positions):
+                rows = chunk.iloc[positions] if len(positions) < len(chunk) else chunk
+                if run is None:
+                    prices[positions] = score_frame(rows, *bundle, sparse_encoder)
+                else:
+                    prices[positions] = run(score_frame, rows, *bundle, sparse_encoder)
+                if years:
+                    if run is None:
+                        year_prices[positions] = score_years(rows, *bundle, years, sparse_encoder)
+                    else:
+                        year_prices[positions] = run(score_years, rows, *bundle, years, sparse_encoder)
+        chunk[PREDICTION_COLUMN] = prices
+        for j, year in enumerate(years or []):
+            chunk[f"{PREDICTION_COLUMN}_{year}"] = year_prices[:, j]
+        if on_scored is not None:
+            on_scored(chunk)
+        chunk.to_csv(output, header=(i == 0), index=False)
+        predictions.append(prices)
+
+        # Aggregates are accumulated per chunk so the full table never has to be kept in memory
+        if "Neighborhood" in chunk.columns:
+            neighborhoods = chunk["Neighborhood"].fillna("Unknown")
+        else:
+            neighborhoods = pd.Series("Unknown", index=chunk.index)
+        grouped = pd.Series(prices[valid], index=chunk.index[valid]).groupby(neighborhoods[valid]).agg(["count", "sum"])
+        for name, row in grouped.iterrows():
+            count, total = totals.get(name, (0, 0.0))
+            totals[name] = (count + row["count"], total + row["sum"])
+
+        rows_done += len(chunk)
+        if progress is not None:
+            progress(rows_done)
+
+    predictions = np.concatenate(predictions) if predictions else np.empty(0)
+    by_neighborhood = pd.DataFrame.from_dict(totals, orient="index", columns=["Count", "TotalPrice"])
+    by_neighborhood.index.name = "Neighborhood"
+    by_neighborhood["Count"] = by_neighborhood["Count"].astype(int)
+    by_neighborhood["MeanPrice"] = by_neighborhood["TotalPrice"] / by_neighborhood["Count"]
+    by_neighborhood = by_neighborhood.sort_values("TotalPrice", ascending=False)
+    return predictions, by_neighborhood
+
+
+def percentile_table(predictions, percentiles=PERCENTILES):
+    """
+    Distribution of the predicted prices at the given percentiles (rows that were not scored are ignored).
+    """
+    predictions = predictions[~np.isnan(predictions)]
+    values = np.percentile(predictions, percentiles) if len(predictions) else [np.nan] * len(percentiles)
+    return pd.DataFrame({"Percentile": percentiles, "PredictedPrice": values})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a CSV of listings with the trained model.")
+    parser.add_argument("input")
+    parser.add_argument("output")
+    parser.add_argument("--model", default="xgboost_model.pkl")
+    parser.add_argument("--pipeline", default="preprocessing_pipeline1.pkl")
+    parser.add_argument("--features", default="expected_features1.pkl")
+    parser.add_argument("--chunksize", type=int, default=50000)
+    parser.add_argument("--no-validation", action="store_true", help="Score every row without checking the input schema")
+    parser.add_argument("--markets", help="Market registry (markets.json) used to score rows by their Market column")
+    parser.add_argument("--market-cache-mb", type=float, default=2048, help="Memory bound for the loaded markets")
+    parser.add_argument("--years", type=parse_years, help="Also value every row in these sale years, e.g. 2006:2015")
+    parser.add_argument("--sparse", action="store_true", help="Feed tree models float32 CSR instead of the dense pipeline output")
+    args = parser.parse_args()
+
+    with open(args.model, "rb") as f:
+        model = pickle.load(f)
+    with open(args.pipeline, "rb") as f:
+        pipeline = pickle.load(f)
+    with open(args.features, "rb") as f:
+        expected_features = pickle.load(f)
+
+    route = None
+    if args.markets:
+        markets, _ = load_registry(args.markets)
+        cache = MarketCache(markets, load_market, int(args.market_cache_mb * 2**20), prefetch_interval=0)
+
+        def route(market_id):
+            bundle = cache.get(market_id).watcher.current()
+            return bundle.pipeline, bundle.model, bundle.expected_features
+
+    if args.sparse and build_sparse_encoder(pipeline, model) is None:
+        print(f"{type(model).__name__} does not support sparse input, using the dense pipeline output", file=sys.stderr)
+
+    def progress(rows_done):
+        print(f"\r{rows_done:,} rows scored", end="", file=sys.stderr)
+
+    with open(args.output, "w", newline="") as out:
+        predictions, by_neighborhood = score_csv(args.input, out, pipeline, model, expected_features,
+                                                 args.chunksize, progress, check_rows=not args.no_validation, route=route,
+                                                 years=args.years, sparse=args.sparse)
+    print(file=sys.stderr)
+    invalid = int(np.isnan(predictions).sum())
+    if invalid:
+        print(f"{invalid:,} rows failed validation and were not scored (see {ERRORS_COLUMN})", file=sys.stderr)
+    print(by_neighborhood.to_string())
+    print(percentile_table(predictions).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+import hashlib
+import json
+import os
+import shutil
+import sys
+
+import numpy as np
+import pandas as pd
+
+# Compact on-disk cache of a CSV dataset.
+# Every column is stored as its own .npy file so it can be memory mapped:
+#   - numeric columns are downcast (int8/int16/int32, float32 when NaNs are present)
+#   - text columns are dictionary encoded (small int codes + a list of categories)
+# The cache remembers the SHA-256 of the source CSV and is rebuilt when it changes.
+#
+# Layout:  <cache>/<stem>/CURRENT          name of the published build
+#          <cache>/<stem>/<build>/meta.json
+#          <cache>/<stem>/<build>/<column>.npy
+# A build is named after the CSV hash and never changes once published. Processes that build at
+# the same time each publish a complete directory and move CURRENT with an atomic rename, so a
+# reader always resolves CURRENT to a whole build and never sees one being replaced.
+
+CACHE_DIR_NAME = ".data_cache"
+META_FILE = "meta.json"
+CURRENT_FILE = "CURRENT"
+CACHE_VERSION = 2
+# Builds kept next to the current one, for readers that resolved CURRENT just before it moved
+KEEP_BUILDS = 2
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """
+    Returns the SHA-256 hex digest of a file, read in chunks.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_path(csv_path, cache_dir=None):
+    """
+    Returns the directory holding the cache builds of csv_path.
+    """
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(csv_path)), CACHE_DIR_NAME)
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(cache_dir, stem)
+
+
+def _smallest_int_dtype(values):
+    # Pick the narrowest signed integer type that holds every value
+    if len(values) == 0:
+        return np.int8
+    low, high = values.min(), values.max()
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return dtype
+    return np.int64
+
+
+def _encode_column(series):
+    """
+    Converts a column into (array, column metadata).
+    """
+    if pd.api.types.is_numeric_dtype(series):
+        if series.isna().any() or pd.api.types.is_float_dtype(series):
+            # Integer columns with missing values (LotFrontage, GarageYrBlt...) become float32
+            return series.to_numpy(dtype=np.float32), {"kind": "numeric"}
+        values = series.to_numpy()
+        return values.astype(_smallest_int_dtype(values)), {"kind": "numeric"}
+
+    # Text column: store sorted categories once and a small int code per row (-1 = missing)
+    codes, categories = pd.factorize(series, sort=True)
+    codes = codes.astype(_smallest_int_dtype(np.array([-1, len(categories)])))
+    return codes, {"kind": "category", "categories": [str(c) for c in categories]}
+
+
+def _source_stamp(csv_path):
+    stat = os.stat(csv_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _read_meta(directory):
+    try:
+        with open(os.path.join(directory, META_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_meta(directory, meta):
+    # Private temp name: other processes may refresh the same meta.json concurrently
+    tmp_path = os.path.join(directory, f".{META_FILE}.tmp-{os.getpid()}")
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f, indent=1)
+    os.replace(tmp_path, os.path.join(directory, META_FILE))
+
+
+def _current_build(directory):
+    try:
+        with open(os.path.join(directory, CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def _write_current(directory, build):
+    tmp_path = os.path.join(directory, f".{CURRENT_FILE}.tmp-{os.getpid()}")
+    with open(tmp_path, "w") as f:
+        f.write(build)
+    os.replace(tmp_path, os.path.join(directory, CURRENT_FILE))
+
+
+def _remove_old_builds(directory, current):
+    # Column files already memory mapped stay readable after their build is removed
+    builds = [entry for entry in os.scandir(directory) if entry.is_dir() and not entry.name.startswith(".") and entry.name != current]
+    builds.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+    for entry in builds[KEEP_BUILDS - 1:]:
+        shutil.rmtree(entry.path, ignore_errors=True)
+    # Files of the version 1 layout, which kept a single build directly in the directory
+    for entry in os.scandir(directory):
+        if entry.is_file() and (entry.name == META_FILE or entry.name.endswith(".npy")):
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+
+def build_cache(csv_path="train.csv", cache_dir=None, source_hash=None):
+    """
+    Parses csv_path once, writes the compact column cache and makes it current. Returns the build directory.
+    """
+    directory = cache_path(csv_path, cache_dir)
+    if source_hash is None:
+        source_hash = file_hash(csv_path)
+    stamp = _source_stamp(csv_path)
+    df = pd.read_csv(csv_path)
+
+    # Write into a private directory first so readers never see a half written build
+    os.makedirs(directory, exist_ok=True)
+    tmp_dir = os.path.join(directory, f".build.tmp-{os.getpid()}")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    columns = []
+    for i, name in enumerate(df.columns):
+        values, info = _encode_column(df[name])
+        file_name = f"{i:03d}.npy"
+        np.save(os.path.join(tmp_dir, file_name), np.ascontiguousarray(values))
+        info.update({"name": name, "file": file_name, "dtype": str(values.dtype)})
+        columns.append(info)
+
+    meta = {
+        "version": CACHE_VERSION,
+        "source": os.path.basename(csv_path),
+        "sha256": source_hash,
+        "rows": len(df),
+        "columns": columns,
+        **stamp,
+    }
+    _write_meta(tmp_dir, meta)
+
+    build = f"{source_hash[:16]}-v{CACHE_VERSION}"
+    build_dir = os.path.join(directory, build)
+    try:
+        os.replace(tmp_dir, build_dir)
+    except OSError:
+        # Another process published the same content first; its build is identical
+        if not os.path.isdir(build_dir):
+            raise
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    _write_current(directory, build)
+    _remove_old_builds(directory, build)
+    return build_dir
+
+
+def _ensure_build(csv_path, cache_dir):
+    """
+    Returns (build directory, metadata) of an up to date cache, rebuilding it when the CSV content changed.
+    """
+    directory = cache_path(csv_path, cache_dir)
+    build = _current_build(directory)
+    meta = _read_meta(os.path.join(directory, build)) if build else None
+    if meta is not None and meta.get("version") == CACHE_VERSION:
+        build_dir = os.path.join(directory, build)
+        stamp = _source_stamp(csv_path)
+        if meta["size"] == stamp["size"] and meta["mtime_ns"] == stamp["mtime_ns"]:
+            return build_dir, meta
+        # File was touched: only rebuild when the content really differs
+        source_hash = file_hash(csv_path)
+        if source_hash == meta["sha256"]:
+            meta.update(stamp)
+            _write_meta(build_dir, meta)
+            return build_dir, meta
+    else:
+        source_hash = None
+
+    build_dir = build_cache(csv_path, cache_dir, source_hash=source_hash)
+    return build_dir, _read_meta(build_dir)
+
+
+def ensure_cache(csv_path="train.csv", cache_dir=None):
+    """
+    Returns the metadata of an up to date cache, rebuilding it when the CSV content changed.
+    """
+    return _ensure_build(csv_path, cache_dir)[1]
+
+
+def load_cached_data(csv_path="train.csv", columns=None, cache_dir=None, mmap=True):
+    """
+    Loads csv_path from its compact cache as a DataFrame.
+    Numeric columns keep their downcast dtypes and text columns come back as pandas categoricals.
+    With mmap=True the column files are memory mapped instead of read into memory.
+    """
+    # Read every column from the build the metadata came from, even if CURRENT moves meanwhile
+    directory, meta = _ensure_build(csv_path, cache_dir)
+    mmap_mode = "r" if mmap else None
+
+    by_name = {col["name"]: col for col in meta["columns"]}
+    names = list(by_name) if columns is None else list(columns)
+    missing = [name for name in names if name not in by_name]
+    if missing:
+        raise KeyError(f"Columns not found in {meta['source']}: {missing}")
+
+    data = {}
+    for name in names:
+        col = by_name[name]
+        values = np.load(os.path.join(directory, col["file"]), mmap_mode=mmap_mode)
+        if col["kind"] == "category":
+            data[name] = pd.Categorical.from_codes(values, categories=col["categories"])
+        else:
+            data[name] = values
+    return pd.DataFrame(data, copy=False)
+
+
+if __name__ == "__main__":
+    # python data_cache.py [file.csv ...] builds (or refreshes) the cache ahead of time
+    for path in sys.argv[1:] or ["train.csv"]:
+        meta = ensure_cache(path)
+        print(f"{path}: {meta['rows']} rows, {len(meta['columns'])} columns -> {cache_path(path)}")
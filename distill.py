@@ -0,0 +1,259 @@
+import argparse
+import json
+import pickle
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import Ridge
+from sklearn.metrics import mean_absolute_error, r2_score, root_mean_squared_error
+from sklearn.model_selection import train_test_split
+from xgboost import XGBRegressor
+
+from features import load_training_frame
+
+# Distillation: train a small "student" model to imitate the stacking ensemble ("teacher").
+# The student learns the teacher's predictions on real training rows plus synthetic houses
+# sampled within the ranges the Streamlit widgets allow, so it can replace the teacher in app.py.
+
+# (min, max) of the numeric widgets in app.py
+UI_RANGES = {
+    "GrLivArea": (100, 10000),
+    "TotalBsmtSF": (0, 7500),
+    "FullBath": (0, 3),
+    "HalfBath": (0, 2),
+    "BsmtFullBath": (0, 3),
+    "BsmtHalfBath": (0, 2),
+    "OverallQual": (1, 10),
+    "OverallCond": (1, 10),
+    "HouseAge": (0, 150),
+    "GarageCars": (0, 5),
+    "BedroomAbvGr": (0, 8),
+    "TotRmsAbvGrd": (2, 14),
+    "KitchenAbvGr": (0, 3),
+    "Fireplaces": (0, 3),
+    "MasVnrArea": (0, 1500),
+    "LotFrontage": (0, 200),
+    "LotArea": (0, 55000),
+    "PoolArea": (500, 750),
+    "TotalPorchSF": (0, 3000),
+}
+
+# Values the app's selectboxes send to the pipeline
+UI_CHOICES = {
+    "MSZoning": ["A", "C", "FV", "I", "RH", "RL", "RP", "RM"],
+    "ExterQual": ["Ex", "Gd", "TA", "Fa", "Po"],
+    "Functional": ["Typ", "Min1", "Min2", "Mod", "Maj1", "Maj2", "Sev", "Sal"],
+    "BsmtQual": ["Ex", "Gd", "TA", "Fa", "Po"],
+    "BsmtFinType1": ["GLQ", "ALQ", "BLQ", "Rec", "LwQ", "Unf"],
+    "BsmtExposure": ["Gd", "Av", "Mn", "No"],
+    "GarageFinish": ["Fin", "RFn", "Unf", "NA"],
+    "KitchenQual": ["Ex", "Gd", "TA", "Fa", "Po"],
+    "Heating": ["Floor", "GasA", "GasW", "Grav", "OthW", "Wall"],
+    "HeatingQC": ["Ex", "Gd", "TA", "Fa", "Po"],
+    "CentralAir": ["N", "Y"],
+    "FireplaceQu": ["Ex", "Gd", "TA", "Fa", "Po", "NA"],
+    "MasVnrType": ["BrkCmn", "BrkFace", "CBlock", "Stone", "None"],
+    # Not asked in the app, left at 0
+    "MoSold": [0],
+    "SaleType": [0],
+    "SaleCondition": [0],
+}
+
+
+def _uniform_int(rng, n, low, high):
+    return rng.integers(low, high + 1, size=n)
+
+
+def sample_ui_inputs(n, reference, rng):
+    """
+    Samples n synthetic houses within the app's valid input ranges.
+    reference is the training frame; it provides the Neighborhood and HouseStyle/MSSubClass combinations.
+    """
+    r = UI_RANGES
+    df = pd.DataFrame(index=range(n))
+
+    pairs = reference[["HouseStyle", "MSSubClass"]].drop_duplicates().to_numpy()
+    picked = pairs[rng.integers(0, len(pairs), size=n)]
+    df["HouseStyle"] = picked[:, 0]
+    df["MSSubClass"] = picked[:, 1].astype(int)
+    df["Neighborhood"] = rng.choice(reference["Neighborhood"].unique(), size=n)
+    for col, choices in UI_CHOICES.items():
+        df[col] = rng.choice(np.array(choices, dtype=object), size=n)
+
+    # Living area and basement (same relationships the widgets enforce)
+    gr_liv_area = _uniform_int(rng, n, *r["GrLivArea"])
+    has_bsmt = rng.random(n) > 0.1
+    total_bsmt = np.where(has_bsmt, _uniform_int(rng, n, *r["TotalBsmtSF"]), 0)
+    bsmt_fin = np.floor(rng.random(n) * (total_bsmt + 1)).astype(int)
+    bsmt_unf = total_bsmt - bsmt_fin
+    df.loc[~has_bsmt, ["BsmtQual", "BsmtFinType1", "BsmtExposure"]] = "NA"
+    df["BsmtUnfSF"] = bsmt_unf
+    # FirstFlrSF + SecondFlrSF always add up to GrLivArea in the app
+    df["TotalSF"] = gr_liv_area + bsmt_fin + bsmt_unf
+    df["TotalArea"] = gr_liv_area + total_bsmt
+
+    bsmt_full = np.where(has_bsmt, _uniform_int(rng, n, *r["BsmtFullBath"]), 0)
+    bsmt_half = np.where(has_bsmt, _uniform_int(rng, n, *r["BsmtHalfBath"]), 0)
+    full_bath = _uniform_int(rng, n, *r["FullBath"])
+    half_bath = _uniform_int(rng, n, *r["HalfBath"])
+    df["TotalBathrooms"] = bsmt_full + full_bath + 0.5 * (half_bath + bsmt_half)
+
+    df["HouseAge"] = _uniform_int(rng, n, *r["HouseAge"])
+    df["HouseRemodelAge"] = np.floor(rng.random(n) * (df["HouseAge"] + 1)).astype(int)
+
+    for col in ["OverallQual", "OverallCond", "BedroomAbvGr", "TotRmsAbvGrd", "KitchenAbvGr",
+                "LotFrontage", "LotArea", "TotalPorchSF"]:
+        df[col] = _uniform_int(rng, n, *r[col])
+
+    df["GarageCars"] = np.where(df["GarageFinish"] == "NA", 0, _uniform_int(rng, n, *r["GarageCars"]))
+    df["Fireplaces"] = np.where(df["FireplaceQu"] == "NA", 0, _uniform_int(rng, n, *r["Fireplaces"]))
+    df["MasVnrArea"] = np.where(df["MasVnrType"] == "None", 0, _uniform_int(rng, n, *r["MasVnrArea"]))
+    # The app always sends a pool area (500 when there is no pool)
+    df["HasPool"] = (rng.random(n) < 0.1).astype(int)
+    df["PoolArea"] = np.where(df["HasPool"] == 1, _uniform_int(rng, n, *r["PoolArea"]), r["PoolArea"][0])
+    return df
+
+
+def jitter_rows(X, n, rng, scale=0.15):
+    """
+    Returns n real rows with their numeric features perturbed by up to +/- scale, clipped to the UI ranges.
+    """
+    rows = X.iloc[rng.integers(0, len(X), size=n)].reset_index(drop=True).copy()
+    for col in rows.columns:
+        if col in ("MSSubClass", "HasPool") or not pd.api.types.is_numeric_dtype(rows[col]):
+            continue
+        noise = 1 + rng.uniform(-scale, scale, size=n)
+        values = np.round(rows[col].to_numpy(dtype=float) * noise)
+        low, high = UI_RANGES.get(col, (values.min(), values.max()))
+        rows[col] = np.clip(values, low, high)
+    return rows
+
+
+def build_augmented_set(X_real, n_synthetic, rng):
+    """
+    Real rows + jittered real rows + uniformly sampled UI inputs.
+    """
+    columns = list(X_real.columns)
+    half = n_synthetic // 2
+    parts = [
+        X_real,
+        jitter_rows(X_real, half, rng),
+        sample_ui_inputs(n_synthetic - half, X_real, rng)[columns],
+    ]
+    return pd.concat(parts, ignore_index=True)
+
+
+def make_student(kind, random_state=13):
+    if kind == "linear":
+        return Ridge(alpha=1.0)
+    # Shallow trees: cheap to evaluate for a single row
+    return XGBRegressor(n_estimators=400, max_depth=5, learning_rate=0.05, subsample=0.9,
+                        colsample_bytree=0.9, random_state=random_state, n_jobs=1)
+
+
+def kaggle_rmse(y_true, y_pred):
+    """
+    Kaggle House Prices metric: RMSE between the logs of the prices.
+    """
+    return root_mean_squared_error(np.log(y_true), np.log(np.clip(y_pred, 1, None)))
+
+
+def measure_latency(model, X, repeats=200):
+    """
+    Returns (median single-row latency in ms, batch throughput in rows/s).
+    """
+    single = []
+    for i in range(repeats):
+        row = X[i % len(X):i % len(X) + 1]
+        start = time.perf_counter()
+        model.predict(row)
+        single.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    model.predict(X)
+    batch_seconds = time.perf_counter() - start
+    return float(np.median(single) * 1000), float(len(X) / batch_seconds)
+
+
+def distill(teacher, pipeline, expected_features, student_kind="xgboost", n_synthetic=20000,
+            csv_path="train.csv", random_state=25):
+    """
+    Trains a student on the teacher's predictions and returns (student, report).
+    """
+    rng = np.random.default_rng(random_state)
+    X, y = load_training_frame(expected_features, csv_path)
+    # Same hold-out split as the notebook, so the teacher never saw the evaluation rows
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=random_state)
+
+    X_aug = build_augmented_set(X_train.reset_index(drop=True), n_synthetic, rng)
+    P_aug = pipeline.transform(X_aug)
+    teacher_aug = teacher.predict(P_aug)
+
+    student = make_student(student_kind)
+    student.fit(P_aug, teacher_aug)
+
+    # Evaluation: real hold-out rows and fresh synthetic inputs
+    P_test = pipeline.transform(X_test)
+    P_synth = pipeline.transform(sample_ui_inputs(5000, X_train, rng)[list(expected_features)])
+    teacher_test, student_test = teacher.predict(P_test), student.predict(P_test)
+    teacher_synth, student_synth = teacher.predict(P_synth), student.predict(P_synth)
+
+    teacher_ms, teacher_rps = measure_latency(teacher, P_test)
+    student_ms, student_rps = measure_latency(student, P_test)
+
+    report = {
+        "student": student_kind,
+        "training_rows": int(len(X_aug)),
+        "fidelity_holdout": {
+            "rmse": float(root_mean_squared_error(teacher_test, student_test)),
+            "mae": float(mean_absolute_error(teacher_test, student_test)),
+            "r2": float(r2_score(teacher_test, student_test)),
+        },
+        "fidelity_synthetic": {
+            "rmse": float(root_mean_squared_error(teacher_synth, student_synth)),
+            "mae": float(mean_absolute_error(teacher_synth, student_synth)),
+            "r2": float(r2_score(teacher_synth, student_synth)),
+        },
+        "kaggle_rmse": {
+            "teacher": float(kaggle_rmse(y_test, teacher_test)),
+            "student": float(kaggle_rmse(y_test, student_test)),
+        },
+        "latency": {
+            "teacher_single_ms": teacher_ms,
+            "student_single_ms": student_ms,
+            "teacher_rows_per_s": teacher_rps,
+            "student_rows_per_s": student_rps,
+        },
+    }
+    return student, report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distill the stacking ensemble into a lightweight model.")
+    parser.add_argument("--teacher", default="stacking_model.pkl")
+    parser.add_argument("--pipeline", default="preprocessing_pipeline1.pkl")
+    parser.add_argument("--features", default="expected_features1.pkl")
+    parser.add_argument("--student", choices=["xgboost", "linear"], default="xgboost")
+    parser.add_argument("--synthetic", type=int, default=20000, help="Number of synthetic training inputs")
+    parser.add_argument("--output", default="distilled_model.pkl")
+    parser.add_argument("--report", default="distill_report.json")
+    args = parser.parse_args()
+
+    with open(args.teacher, "rb") as f:
+        teacher = pickle.load(f)
+    with open(args.pipeline, "rb") as f:
+        pipeline = pickle.load(f)
+    with open(args.features, "rb") as f:
+        expected_features = pickle.load(f)
+
+    student, report = distill(teacher, pipeline, expected_features, args.student, args.synthetic)
+
+    with open(args.output, "wb") as f:
+        pickle.dump(student, f)
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+from data_cache import load_cached_data
+
+# Feature engineering used to build the training set (same steps as House_Prices_Project.ipynb)
+
+# Missing values that mean "feature not present" in the Kaggle data
+TRAINING_FILLNA = {
+    "MasVnrType": "No",
+    "MasVnrArea": 0,
+    "FireplaceQu": "No",
+    "LotFrontage": 0,
+    "GarageFinish": "No",
+    "BsmtQual": "No",
+    "BsmtFinType1": "Unf",
+    "BsmtExposure": "No",
+}
+
+# Rows dropped as outliers in the notebook
+OUTLIER_IDS = [598, 955, 935, 1299, 250, 314, 336, 707, 379, 1183, 692, 186, 441, 524, 739, 636, 1062, 1191, 496, 1338]
+
+
+def engineer_features(df):
+    """
+    Adds the engineered features to a DataFrame with the original Kaggle columns.
+    """
+    df = df.copy()
+    # Categoricals coming from the data cache are converted back to plain text columns, and its
+    # downcast numeric columns (int8/int16/float32) are widened so the sums below cannot overflow
+    for col in df.columns:
+        dtype = df[col].dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(object)
+        elif pd.api.types.is_bool_dtype(dtype):
+            continue
+        elif pd.api.types.is_integer_dtype(dtype):
+            df[col] = df[col].astype(np.int64)
+        elif pd.api.types.is_float_dtype(dtype):
+            df[col] = df[col].astype(np.float64)
+    df = df.fillna({col: value for col, value in TRAINING_FILLNA.items() if col in df.columns})
+
+    df["HouseAge"] = df["YrSold"] - df["YearBuilt"]
+    df["HouseRemodelAge"] = df["YrSold"] - df["YearRemodAdd"]
+    df["TotalBathrooms"] = df["BsmtFullBath"] + df["FullBath"] + 0.5 * (df["HalfBath"] + df["BsmtHalfBath"])
+    df["HasPool"] = (df["PoolArea"] > 0).astype(int)
+    df["TotalPorchSF"] = df["OpenPorchSF"] + df["EnclosedPorch"] + df["3SsnPorch"] + df["ScreenPorch"] + df["WoodDeckSF"]
+    df["TotalSF"] = df["1stFlrSF"] + df["2ndFlrSF"] + df["BsmtFinSF1"] + df["BsmtFinSF2"]
+    df["TotalArea"] = df["GrLivArea"] + df["TotalBsmtSF"]
+    return df
+
+
+def load_training_frame(expected_features, csv_path="train.csv", drop_outliers=True):
+    """
+    Returns (X, y) for training: X holds the expected model features, y the SalePrice.
+    """
+    train = load_cached_data(csv_path)
+    if drop_outliers:
+        train = train[~np.isin(train["Id"], OUTLIER_IDS)]
+    train = engineer_features(train).reset_index(drop=True)
+    X = train[list(expected_features)]
+    y = train["SalePrice"].astype(np.float64)
+    return X, y
@@ -0,0 +1,175 @@
+import hashlib
+import os
+import pickle
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from data_cache import file_hash
+
+# Zero-downtime model reload.
+# ModelWatcher polls the artifact files (the model and pipeline pkl files, or the CURRENT file of a
+# model store). When they change (and have stopped changing), the new artifacts are loaded and
+# validated on a background thread, then swapped in with a single reference assignment. A rerun
+# takes one snapshot with current() and uses it until the end, so reruns already in progress
+# finish on the old model.
+#
+# Deploy a new model by writing the new pkl next to the old one and renaming it over it
+# (os.replace / mv), so the watcher never reads a half written file.
+
+ModelBundle = namedtuple("ModelBundle", ["model", "pipeline", "expected_features", "version", "loaded_at"])
+
+
+class ModelValidationError(RuntimeError):
+    """
+    Raised when new artifacts fail the smoke test.
+    """
+
+
+def artifact_version(paths):
+    """
+    Short content hash identifying a set of artifact files.
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(file_hash(path).encode())
+    return digest.hexdigest()[:12]
+
+
+def _stamp(paths):
+    stamps = []
+    for path in paths:
+        stat = os.stat(path)
+        stamps.append((stat.st_size, stat.st_mtime_ns))
+    return tuple(stamps)
+
+
+def load_bundle(model_path, pipeline_path, prepare=None):
+    """
+    Loads a model and its preprocessing pipeline. prepare(obj) is applied to both after unpickling.
+    """
+    version = artifact_version([model_path, pipeline_path])
+    with open(model_path, "rb") as f:
+        model = pickle.load(f)
+    with open(pipeline_path, "rb") as f:
+        pipeline = pickle.load(f)
+    if prepare is not None:
+        model = prepare(model)
+        pipeline = prepare(pipeline)
+    return ModelBundle(model, pipeline, np.asarray(pipeline.feature_names_in_), version, time.time())
+
+
+def validate_bundle(bundle, validation_rows, reference=None, max_relative_change=0.5):
+    """
+    Smoke test for a freshly loaded bundle.
+    The pipeline must accept the validation rows, the model must return one finite, positive price per row,
+    and the median change against the reference bundle's prices must stay within max_relative_change.
+    """
+    X = validation_rows.reindex(columns=list(bundle.expected_features), fill_value=0)
+    try:
+        prices = np.asarray(bundle.model.predict(bundle.pipeline.transform(X)), dtype=np.float64)
+    except Exception as e:
+        raise ModelValidationError(f"Prediction failed: {e}") from e
+    if prices.shape != (len(X),):
+        raise ModelValidationError(f"Expected {len(X)} predictions, got shape {prices.shape}")
+    if not np.all(np.isfinite(prices)) or np.any(prices <= 0):
+        raise ModelValidationError("Predictions contain non-finite or non-positive prices")
+
+    if reference is not None:
+        X_ref = validation_rows.reindex(columns=list(reference.expected_features), fill_value=0)
+        reference_prices = np.asarray(reference.model.predict(reference.pipeline.transform(X_ref)), dtype=np.float64)
+        change = float(np.median(np.abs(prices - reference_prices) / reference_prices))
+        if change > max_relative_change:
+            raise ModelValidationError(f"Median price change against the current model is {change:.0%}")
+    return prices
+
+
+class ModelWatcher:
+    """
+    paths are the files to watch, loader() returns a new ModelBundle
+    (e.g. lambda: load_bundle(model_path, pipeline_path)).
+    """
+
+    def __init__(self, paths, loader, validation_rows, poll_interval=5.0, max_relative_change=0.5):
+        self.loader = loader
+        self.validation_rows = validation_rows
+        self.poll_interval = poll_interval
+        self.max_relative_change = max_relative_change
+
+        self.reloads = 0
+        self.rejected = 0
+        self.last_error = None
+        self._paths = list(paths)
+        self._stamp = _stamp(self._paths)
+        self._bundle = loader()
+        validate_bundle(self._bundle, validation_rows)
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="model-watcher", daemon=True)
+        self._thread.start()
+
+    def current(self):
+        """
+        The bundle in service. Take it once per rerun and use it for the whole rerun.
+        """
+        return self._bundle
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        return {
+            "version": self._bundle.version,
+            "loaded_at": self._bundle.loaded_at,
+            "reloads": self.reloads,
+            "rejected": self.rejected,
+            "last_error": self.last_error,
+        }
+
+    def check(self):
+        """
+        Loads, validates and swaps in the artifacts if they changed. Returns True when a new bundle was swapped in.
+        """
+        try:
+            stamp = _stamp(self._paths)
+        except OSError:
+            # A file is being replaced right now
+            return False
+        if stamp == self._stamp:
+            return False
+
+        # Wait until the files stop changing before reading them
+        time.sleep(min(self.poll_interval, 1.0))
+        try:
+            if _stamp(self._paths) != stamp:
+                return False
+        except OSError:
+            # Removed again before the copy finished (e.g. rm + cp): not stable yet
+            return False
+        self._stamp = stamp
+
+        current = self._bundle
+        try:
+            bundle = self.loader()
+            if bundle.version == current.version:
+                return False
+            validate_bundle(bundle, self.validation_rows, current, self.max_relative_change)
+        except Exception as e:
+            self.rejected += 1
+            self.last_error = f"{type(e).__name__}: {e}"
+            return False
+
+        self._bundle = bundle
+        self.reloads += 1
+        self.last_error = None
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.check()
+            except Exception as e:
+                # The watcher must keep polling; the error is shown in the stats
+                self.last_error = f"{type(e).__name__}: {e}"
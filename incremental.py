@@ -0,0 +1,146 @@
+import math
+
+import numpy as np
+from sklearn.compose import ColumnTransformer
+from sklearn.impute import SimpleImputer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, OrdinalEncoder, StandardScaler
+
+# Incremental feature vectors for the app.
+# Every block of the fitted preprocessing pipeline works column by column (mean imputing and
+# scaling, ordinal lookup, one-hot), so each input feature owns a fixed set of output slots.
+# FeatureEncoder compiles the fitted pipeline into one small encoder per feature, and
+# update_vector() re-encodes only the features whose value changed since the last vector.
+# Engineered features (TotalArea, TotalSF, ...) are recomputed from the raw widgets on every rerun,
+# so a raw change reaches exactly the slots of the engineered features whose value moved
+# (e.g. BsmtFinSF -> BsmtUnfSF changes the BsmtUnfSF slot, while TotalSF stays the same).
+# Pipelines with any other step are not compiled; the caller falls back to pipeline.transform.
+
+
+class UnsupportedPipeline(ValueError):
+    """
+    The pipeline contains a step that cannot be encoded column by column.
+    """
+
+
+def _is_missing(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def column_transformer(pipeline):
+    if isinstance(pipeline, ColumnTransformer):
+        return pipeline
+    if isinstance(pipeline, Pipeline) and len(pipeline.steps) == 1 and isinstance(pipeline.steps[0][1], ColumnTransformer):
+        return pipeline.steps[0][1]
+    raise UnsupportedPipeline("Expected a ColumnTransformer (optionally inside a one-step Pipeline)")
+
+
+def _column_encoders(steps, j):
+    """
+    Chain of scalar functions for column j of a block, plus the number of output slots.
+    """
+    funcs = []
+    width = 1
+    for step in steps:
+        if isinstance(step, SimpleImputer):
+            if not (isinstance(step.missing_values, float) and math.isnan(step.missing_values)) or step.add_indicator:
+                raise UnsupportedPipeline("SimpleImputer must impute NaN without indicator")
+            fill = step.statistics_[j]
+            funcs.append(lambda v, fill=fill: fill if _is_missing(v) else v)
+        elif isinstance(step, StandardScaler):
+            mean = step.mean_[j] if step.with_mean else 0.0
+            scale = step.scale_[j] if step.with_std else 1.0
+            funcs.append(lambda v, mean=mean, scale=scale: (float(v) - mean) / scale)
+        elif isinstance(step, OrdinalEncoder):
+            if step.handle_unknown != "use_encoded_value":
+                raise UnsupportedPipeline("OrdinalEncoder must encode unknown values")
+            lookup = {category: float(i) for i, category in enumerate(step.categories_[j])}
+            unknown = float(step.unknown_value)
+            funcs.append(lambda v, lookup=lookup, unknown=unknown: lookup.get(v, unknown))
+        elif isinstance(step, OneHotEncoder):
+            if step.drop is not None or getattr(step, "_infrequent_enabled", False) or step.handle_unknown != "ignore":
+                raise UnsupportedPipeline("OneHotEncoder must keep every category and ignore unknown values")
+            categories = step.categories_[j]
+            lookup = {category: i for i, category in enumerate(categories)}
+            width = len(categories)
+
+            def one_hot(v, lookup=lookup, width=width):
+                out = np.zeros(width)
+                i = lookup.get(v)
+                if i is not None:
+                    out[i] = 1.0
+                return out
+            funcs.append(one_hot)
+        else:
+            raise UnsupportedPipeline(f"Unsupported step {type(step).__name__}")
+    return funcs, width
+
+
+class FeatureEncoder:
+    """
+    Encodes single rows of input features straight into the pipeline's output vector.
+    """
+
+    def __init__(self, pipeline, expected_features):
+        ct = column_transformer(pipeline)
+        self.features = list(expected_features)
+        self.slots = {}
+        self._funcs = {}
+        covered = 0
+        for name, transformer, columns in ct.transformers_:
+            out = ct.output_indices_[name]
+            if name == "remainder" or transformer == "drop":
+                if out.stop - out.start:
+                    raise UnsupportedPipeline("Remainder columns are not supported")
+                continue
+            steps = [step for _, step in transformer.steps] if isinstance(transformer, Pipeline) else [transformer]
+            start = out.start
+            for j, column in enumerate(columns):
+                funcs, width = _column_encoders(steps, j)
+                self.slots[column] = slice(start, start + width)
+                self._funcs[column] = funcs
+                start += width
+            if start != out.stop:
+                raise UnsupportedPipeline(f"Block {name} produced an unexpected number of columns")
+            covered += out.stop - out.start
+        self.n_outputs = covered
+        missing = [feature for feature in self.features if feature not in self.slots]
+        if missing:
+            raise UnsupportedPipeline(f"Features without output slots: {missing}")
+
+    def encode(self, feature, value):
+        for func in self._funcs[feature]:
+            value = func(value)
+        return value
+
+    def transform_row(self, row):
+        """
+        Full output vector (shape (1, n_outputs)) of one row given as a dict.
+        """
+        vector = np.empty((1, self.n_outputs))
+        for feature in self.features:
+            vector[0, self.slots[feature]] = self.encode(feature, row[feature])
+        return vector
+
+    def update_vector(self, vector, previous, row):
+        """
+        Copy of vector with only the slots of the features that differ between previous and row re-encoded.
+        Returns (vector, changed features).
+        """
+        changed = [feature for feature in self.features if previous.get(feature) != row[feature]]
+        if not changed:
+            return vector, changed
+        vector = vector.copy()
+        for feature in changed:
+            vector[0, self.slots[feature]] = self.encode(feature, row[feature])
+        return vector, changed
+
+
+def build_encoder(pipeline, expected_features):
+    """
+    FeatureEncoder for the pipeline, or None when the pipeline cannot be encoded column by column.
+    """
+    try:
+        return FeatureEncoder(pipeline, expected_features)
+    except UnsupportedPipeline:
+        return None
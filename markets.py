@@ -0,0 +1,240 @@
+import json
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from data_cache import load_cached_data
+from features import load_training_frame
+from hot_reload import ModelWatcher, load_bundle
+import model_store
+
+# Market registry.
+# Every market (markets.json) has its own model, pipeline, reference sales and neighborhoods.
+# MarketCache loads a market the first time it is requested and keeps the loaded markets in an
+# LRU cache bounded by size (estimated from the artifact files): when a load goes over the bound,
+# the least recently used markets are dropped and their model watchers stopped. Sessions that
+# still hold a bundle of an evicted market finish their rerun on it. A background thread
+# prefetches the markets with the most recent traffic while there is room for them.
+
+DEFAULT_REGISTRY = "markets.json"
+MARKET_COLUMN = "Market"
+
+Market = namedtuple("Market", [
+    "market_id", "name", "model", "pipeline", "features", "reference_data", "store",
+    "neighborhoods", "default_neighborhood",
+])
+LoadedMarket = namedtuple("LoadedMarket", ["market", "watcher", "reference_data", "size"])
+
+
+def load_registry(path=DEFAULT_REGISTRY):
+    """
+    Returns (markets, default market id). Relative artifact paths are relative to the registry file.
+    """
+    with open(path) as f:
+        registry = json.load(f)
+    base = os.path.dirname(os.path.abspath(path))
+
+    def resolve(value):
+        return os.path.join(base, value) if value else None
+
+    markets = {}
+    for market_id, config in registry["markets"].items():
+        neighborhoods = config.get("neighborhoods", {})
+        markets[market_id] = Market(
+            market_id=market_id,
+            name=config.get("name", market_id),
+            model=resolve(config.get("model")),
+            pipeline=resolve(config.get("pipeline")),
+            features=resolve(config["features"]),
+            reference_data=resolve(config["reference_data"]),
+            store=resolve(config.get("store")),
+            neighborhoods=neighborhoods,
+            default_neighborhood=config.get("default_neighborhood", next(iter(neighborhoods), None)),
+        )
+    return markets, registry.get("default_market", next(iter(markets)))
+
+
+def market_size(market):
+    """
+    Memory estimate of a loaded market: the size of its artifact files.
+    """
+    if market.store:
+        version_dir = os.path.join(market.store, model_store.current_version(market.store))
+        paths = [os.path.join(version_dir, name) for name in os.listdir(version_dir)]
+    else:
+        paths = [market.model, market.pipeline]
+    return sum(os.path.getsize(path) for path in paths if os.path.isfile(path))
+
+
+def load_market(market, prepare=None, validation_size=200, poll_interval=5.0):
+    """
+    Loads the model of a market behind a ModelWatcher, plus its reference sale prices.
+    """
+    with open(market.features, "rb") as f:
+        expected_features = pickle.load(f)
+    # Real houses of the market used to smoke test new artifacts before they are swapped in
+    validation_rows, _ = load_training_frame(expected_features, csv_path=market.reference_data)
+    validation_rows = validation_rows.sample(min(validation_size, len(validation_rows)), random_state=13)
+
+    if market.store:
+        paths = [os.path.join(market.store, model_store.CURRENT_FILE)]
+        loader = lambda: model_store.attach_bundle(market.store, prepare)
+    else:
+        paths = [market.model, market.pipeline]
+        loader = lambda: load_bundle(market.model, market.pipeline, prepare)
+    watcher = ModelWatcher(paths, loader, validation_rows, poll_interval)
+    reference_data = load_cached_data(market.reference_data, columns=["SalePrice"])
+    return LoadedMarket(market, watcher, reference_data, market_size(market))
+
+
+class MarketCache:
+    """
+    loader(market) returns a LoadedMarket (e.g. load_market). max_bytes bounds the total size of the
+    loaded markets; the market just loaded is always kept, even when it alone is over the bound.
+    """
+
+    def __init__(self, markets, loader, max_bytes, half_life=600.0, prefetch_interval=30.0, prefetch_share=0.1):
+        self.markets = markets
+        self.loader = loader
+        self.max_bytes = max_bytes
+        self.half_life = half_life
+        self.prefetch_share = prefetch_share
+
+        self.loads = 0
+        self.evictions = 0
+        self.prefetches = 0
+        self._loaded = OrderedDict()
+        self._loading = {}
+        self._traffic = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        if prefetch_interval:
+            self._thread = threading.Thread(target=self._run, args=(prefetch_interval,), name="market-prefetch", daemon=True)
+            self._thread.start()
+
+    def get(self, market_id):
+        """
+        The LoadedMarket of market_id, loaded on first use. Raises KeyError for unknown markets.
+        """
+        if market_id not in self.markets:
+            raise KeyError(f"Unknown market: {market_id}")
+        self._record(market_id)
+        return self._get(market_id)
+
+    def used_bytes(self):
+        with self._lock:
+            return sum(entry.size for entry in self._loaded.values())
+
+    def traffic(self):
+        """
+        Recent requests per market, decayed with the half life.
+        """
+        now = time.monotonic()
+        with self._lock:
+            return {
+                market_id: score * 0.5 ** ((now - at) / self.half_life)
+                for market_id, (score, at) in self._traffic.items()
+            }
+
+    def prefetch(self):
+        """
+        Loads the markets with a large enough share of the recent traffic that fit in the free space.
+        Returns the ids of the markets loaded.
+        """
+        traffic = self.traffic()
+        total = sum(traffic.values())
+        loaded = []
+        for market_id, score in sorted(traffic.items(), key=lambda item: -item[1]):
+            if score < self.prefetch_share * total:
+                break
+            with self._lock:
+                if market_id in self._loaded or market_id in self._loading:
+                    continue
+                free = self.max_bytes - sum(entry.size for entry in self._loaded.values())
+            try:
+                if market_size(self.markets[market_id]) > free:
+                    continue
+                self._get(market_id)
+            except Exception:
+                # A broken market is reported when it is requested, not by the prefetcher
+                continue
+            self.prefetches += 1
+            loaded.append(market_id)
+        return loaded
+
+    def stats(self):
+        with self._lock:
+            loaded = list(self._loaded)
+        return {
+            "loaded": loaded,
+            "used_bytes": self.used_bytes(),
+            "max_bytes": self.max_bytes,
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "prefetches": self.prefetches,
+        }
+
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            entries = list(self._loaded.values())
+        for entry in entries:
+            entry.watcher.stop()
+
+    def _record(self, market_id):
+        now = time.monotonic()
+        with self._lock:
+            score, at = self._traffic.get(market_id, (0.0, now))
+            self._traffic[market_id] = (score * 0.5 ** ((now - at) / self.half_life) + 1.0, now)
+
+    def _get(self, market_id):
+        with self._lock:
+            entry = self._loaded.get(market_id)
+            if entry is not None:
+                self._loaded.move_to_end(market_id)
+                return entry
+            load_lock = self._loading.setdefault(market_id, threading.Lock())
+
+        # One load per market at a time; other requests for it wait for that load
+        with load_lock:
+            with self._lock:
+                entry = self._loaded.get(market_id)
+                if entry is not None:
+                    self._loaded.move_to_end(market_id)
+                    return entry
+            try:
+                entry = self.loader(self.markets[market_id])
+            except BaseException:
+                with self._lock:
+                    self._loading.pop(market_id, None)
+                raise
+            # Added to _loaded before it leaves _loading, so no request sees neither and loads it again
+            with self._lock:
+                self._loaded[market_id] = entry
+                self._loading.pop(market_id, None)
+                self.loads += 1
+                evicted = self._evict(keep=market_id)
+        for old in evicted:
+            old.watcher.stop()
+        return entry
+
+    def _evict(self, keep):
+        evicted = []
+        used = sum(entry.size for entry in self._loaded.values())
+        for market_id in list(self._loaded):
+            if used <= self.max_bytes:
+                break
+            if market_id == keep:
+                continue
+            entry = self._loaded.pop(market_id)
+            used -= entry.size
+            evicted.append(entry)
+            self.evictions += 1
+        return evicted
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            self.prefetch()
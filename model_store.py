@@ -0,0 +1,381 @@
+import argparse
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+# Shared-memory model store for running several app / worker processes on one host.
+#
+# One loader process publishes a model: the trees of every RandomForest, GradientBoosting and
+# XGBoost regressor inside it (including the ones nested in StackingRegressor / VotingRegressor /
+# GridSearchCV) are flattened into node arrays and written as .npy files under a shared-memory
+# directory (/dev/shm by default). In the pickled "skeleton" those estimators are replaced by
+# SharedForest objects that only hold array names. Every other process attaches to the store:
+# it unpickles the small skeleton and memory maps the node arrays read-only, so all processes
+# share one copy of the trees through the page cache.
+#
+# Estimators without a tree converter (LightGBM, Ridge...) and the preprocessing pipeline stay in
+# the skeleton and are unpickled per process; they are small compared to the forests.
+#
+# Layout:  <store>/CURRENT            name of the published version
+#          <store>/<version>/skeleton.pkl
+#          <store>/<version>/arrays/<forest>_<field>.npy
+
+DEFAULT_STORE_DIR = "/dev/shm/houseprices_model_store" if os.path.isdir("/dev/shm") else os.path.join(tempfile.gettempdir(), "houseprices_model_store")
+CURRENT_FILE = "CURRENT"
+SKELETON_FILE = "skeleton.pkl"
+ARRAY_FIELDS = ["feature", "threshold", "left", "right", "value", "default_left", "roots"]
+# Rows evaluated at a time, bounds the (rows x trees) index matrix
+PREDICT_BLOCK_ROWS = 4096
+
+
+class SharedForest:
+    """
+    Regression tree ensemble evaluated from flat node arrays:
+        prediction = base + scale * sum(leaf value of every tree)
+    Leaves have left == -1. Samples go left when x <= threshold (scikit-learn) or x < threshold (XGBoost),
+    and follow default_left when x is missing.
+    """
+
+    def __init__(self, name, base, scale, strict_less, max_depth, n_features_in):
+        self.name = name
+        self.base = base
+        self.scale = scale
+        self.strict_less = strict_less
+        self.max_depth = max_depth
+        self.n_features_in_ = n_features_in
+        self.arrays = None
+
+    def __getstate__(self):
+        # Arrays are never pickled, they are attached from the store
+        state = self.__dict__.copy()
+        state["arrays"] = None
+        return state
+
+    def get_params(self, deep=True):
+        return {}
+
+    def bind(self, arrays):
+        self.arrays = arrays
+
+    def predict(self, X):
+        if self.arrays is None:
+            raise RuntimeError(f"SharedForest {self.name} is not attached to a model store")
+        # Both libraries compare features as float32
+        X = np.asarray(X, dtype=np.float32)
+        out = np.empty(len(X), dtype=np.float64)
+        for start in range(0, len(X), PREDICT_BLOCK_ROWS):
+            block = X[start:start + PREDICT_BLOCK_ROWS]
+            out[start:start + len(block)] = self._predict_block(block)
+        return out
+
+    def _predict_block(self, X):
+        a = self.arrays
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(a["roots"], (len(X), len(a["roots"]))).copy()
+        for _ in range(self.max_depth):
+            left = a["left"][node]
+            is_leaf = left < 0
+            if is_leaf.all():
+                break
+            x = X[rows, np.where(is_leaf, 0, a["feature"][node])]
+            threshold = a["threshold"][node]
+            go_left = x < threshold if self.strict_less else x <= threshold
+            go_left = np.where(np.isnan(x), a["default_left"][node], go_left)
+            node = np.where(is_leaf, node, np.where(go_left, left, a["right"][node]))
+        return self.base + self.scale * a["value"][node].sum(axis=1)
+
+
+# === Converters: fitted estimator -> (node arrays, SharedForest settings) ===
+
+def _concat_trees(trees):
+    """
+    trees: list of dicts with per-node arrays (local child indices). Returns flat arrays with global indices.
+    """
+    fields = {field: [] for field in ARRAY_FIELDS if field != "roots"}
+    roots, offset, max_depth = [], 0, 0
+    for tree in trees:
+        left, right = tree["left"], tree["right"]
+        roots.append(offset)
+        fields["left"].append(np.where(left >= 0, left + offset, -1))
+        fields["right"].append(np.where(right >= 0, right + offset, -1))
+        for field in ("feature", "threshold", "value", "default_left"):
+            fields[field].append(tree[field])
+        offset += len(left)
+        max_depth = max(max_depth, tree["depth"])
+    arrays = {
+        "feature": np.concatenate(fields["feature"]).astype(np.int32),
+        "threshold": np.concatenate(fields["threshold"]),
+        "left": np.concatenate(fields["left"]).astype(np.int32),
+        "right": np.concatenate(fields["right"]).astype(np.int32),
+        "value": np.concatenate(fields["value"]).astype(np.float64),
+        "default_left": np.concatenate(fields["default_left"]).astype(bool),
+        "roots": np.array(roots, dtype=np.int32),
+    }
+    return arrays, max_depth
+
+
+def _tree_depth(left, right):
+    depth = np.zeros(len(left), dtype=np.int32)
+    # Children always come after their parent in both libraries
+    for i in range(len(left)):
+        if left[i] >= 0:
+            depth[left[i]] = depth[right[i]] = depth[i] + 1
+    return int(depth.max())
+
+
+def _sklearn_tree(tree):
+    t = tree.tree_
+    if t.n_outputs != 1:
+        raise ValueError("Only single-output trees are supported")
+    nodes = t.__getstate__()["nodes"]
+    if "missing_go_to_left" in nodes.dtype.names:
+        default_left = nodes["missing_go_to_left"].astype(bool)
+    else:
+        default_left = np.zeros(t.node_count, dtype=bool)
+    left = t.children_left.astype(np.int64)
+    right = t.children_right.astype(np.int64)
+    return {
+        "feature": np.where(left >= 0, t.feature, 0),
+        "threshold": t.threshold.astype(np.float64),
+        "left": left,
+        "right": right,
+        "value": t.value[:, 0, 0],
+        "default_left": default_left,
+        "depth": _tree_depth(left, right),
+    }
+
+
+def _convert_forest(estimator):
+    trees = [_sklearn_tree(tree) for tree in estimator.estimators_]
+    return trees, 0.0, 1.0 / len(trees), False
+
+
+def _convert_gradient_boosting(estimator):
+    init = estimator.init_
+    if isinstance(init, str) and init == "zero":
+        base = 0.0
+    elif hasattr(init, "constant_"):
+        base = float(np.ravel(init.constant_)[0])
+    else:
+        raise ValueError("Only constant init estimators are supported")
+    trees = [_sklearn_tree(stage[0]) for stage in estimator.estimators_]
+    return trees, base, float(estimator.learning_rate), False
+
+
+def _convert_xgboost(estimator):
+    config = json.loads(estimator.get_booster().save_raw("json"))
+    learner = config["learner"]
+    if learner["objective"]["name"] != "reg:squarederror" or learner["gradient_booster"]["name"] != "gbtree":
+        raise ValueError("Only gbtree models with reg:squarederror are supported")
+    model = learner["gradient_booster"]["model"]
+    best_iteration = getattr(estimator, "best_iteration", None)
+    n_trees = len(model["trees"])
+    if best_iteration is not None:
+        # predict() stops at the best iteration of early stopping
+        n_trees = (best_iteration + 1) * int(model["gbtree_model_param"]["num_parallel_tree"])
+
+    trees = []
+    for tree in model["trees"][:n_trees]:
+        left = np.array(tree["left_children"], dtype=np.int64)
+        right = np.array(tree["right_children"], dtype=np.int64)
+        conditions = np.array(tree["split_conditions"], dtype=np.float32)
+        is_leaf = left < 0
+        trees.append({
+            "feature": np.where(is_leaf, 0, np.array(tree["split_indices"])),
+            # float32 thresholds: XGBoost compares float32 values
+            "threshold": conditions,
+            "left": left,
+            "right": right,
+            # For leaves split_conditions holds the leaf weight
+            "value": np.where(is_leaf, conditions, 0).astype(np.float64),
+            "default_left": np.array(tree["default_left"], dtype=bool),
+            "depth": _tree_depth(left, right),
+        })
+    base_score = learner["learner_model_param"]["base_score"].strip("[]")
+    return trees, float(base_score), 1.0, True
+
+
+def _converter(estimator):
+    from sklearn.ensemble import ExtraTreesRegressor, GradientBoostingRegressor, RandomForestRegressor
+    from xgboost import XGBRegressor
+
+    if isinstance(estimator, (RandomForestRegressor, ExtraTreesRegressor)) and hasattr(estimator, "estimators_"):
+        return _convert_forest
+    if isinstance(estimator, GradientBoostingRegressor) and hasattr(estimator, "estimators_"):
+        return _convert_gradient_boosting
+    if isinstance(estimator, XGBRegressor) and getattr(estimator, "_Booster", None) is not None:
+        return _convert_xgboost
+    return None
+
+
+# === Object graph walk ===
+
+def _replace_in_graph(obj, replace, seen=None):
+    """
+    Calls replace(estimator) on every estimator reachable from obj and stores its return value in
+    place of the estimator (in attributes, lists, tuples and dicts). Returns the replacement of obj itself.
+    """
+    if seen is None:
+        seen = {}
+    if id(obj) in seen:
+        return seen[id(obj)]
+    new = replace(obj)
+    seen[id(obj)] = new
+    if new is not obj or not hasattr(obj, "get_params"):
+        return new
+
+    def visit(value):
+        if hasattr(value, "get_params") and not isinstance(value, type):
+            return _replace_in_graph(value, replace, seen)
+        if isinstance(value, list):
+            return [visit(item) for item in value]
+        if isinstance(value, tuple):
+            return tuple(visit(item) for item in value)
+        if isinstance(value, dict):
+            # Also covers sklearn Bunch (named_estimators_)
+            for key in list(value):
+                value[key] = visit(value[key])
+            return value
+        return value
+
+    for attr, value in list(vars(obj).items()):
+        if isinstance(value, (list, tuple, dict)) or hasattr(value, "get_params"):
+            setattr(obj, attr, visit(value))
+    return obj
+
+
+def _shared_forests(obj):
+    found = []
+
+    def collect(estimator):
+        if isinstance(estimator, SharedForest):
+            found.append(estimator)
+        return estimator
+
+    _replace_in_graph(obj, collect)
+    return found
+
+
+# === Publish / attach ===
+
+def publish(model, pipeline, version, store_dir=DEFAULT_STORE_DIR, keep_versions=2):
+    """
+    Publishes model and pipeline as a new version of the store and makes it current.
+    The model object is modified (its tree ensembles are replaced by SharedForest objects).
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    tmp_dir = os.path.join(store_dir, f".{version}.tmp-{os.getpid()}")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(os.path.join(tmp_dir, "arrays"))
+
+    counter = [0]
+
+    def to_shared(estimator):
+        converter = _converter(estimator)
+        if converter is None:
+            return estimator
+        trees, base, scale, strict_less = converter(estimator)
+        arrays, max_depth = _concat_trees(trees)
+        name = f"forest{counter[0]:03d}"
+        counter[0] += 1
+        for field, values in arrays.items():
+            np.save(os.path.join(tmp_dir, "arrays", f"{name}_{field}.npy"), values)
+        return SharedForest(name, base, scale, strict_less, max_depth, getattr(estimator, "n_features_in_", None))
+
+    skeleton_model = _replace_in_graph(model, to_shared)
+    with open(os.path.join(tmp_dir, SKELETON_FILE), "wb") as f:
+        pickle.dump({"model": skeleton_model, "pipeline": pipeline, "version": version}, f)
+
+    version_dir = os.path.join(store_dir, version)
+    if os.path.isdir(version_dir):
+        shutil.rmtree(tmp_dir)
+    else:
+        os.replace(tmp_dir, version_dir)
+    _write_current(store_dir, version)
+    _remove_old_versions(store_dir, keep_versions)
+    return version_dir
+
+
+def _write_current(store_dir, version):
+    tmp_path = os.path.join(store_dir, f".{CURRENT_FILE}.tmp-{os.getpid()}")
+    with open(tmp_path, "w") as f:
+        f.write(version)
+    os.replace(tmp_path, os.path.join(store_dir, CURRENT_FILE))
+
+
+def _remove_old_versions(store_dir, keep_versions):
+    # Processes still attached to a removed version keep their mappings until they reload
+    versions = [entry for entry in os.scandir(store_dir) if entry.is_dir() and not entry.name.startswith(".")]
+    versions.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+    for entry in versions[keep_versions:]:
+        shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def current_version(store_dir=DEFAULT_STORE_DIR):
+    with open(os.path.join(store_dir, CURRENT_FILE)) as f:
+        return f.read().strip()
+
+
+def attach(store_dir=DEFAULT_STORE_DIR, version=None):
+    """
+    Returns (model, pipeline, version) of the store. Tree arrays are memory mapped read-only, not copied.
+    """
+    version = version or current_version(store_dir)
+    version_dir = os.path.join(store_dir, version)
+    with open(os.path.join(version_dir, SKELETON_FILE), "rb") as f:
+        published = pickle.load(f)
+    for forest in _shared_forests(published["model"]):
+        forest.bind({
+            field: np.load(os.path.join(version_dir, "arrays", f"{forest.name}_{field}.npy"), mmap_mode="r")
+            for field in ARRAY_FIELDS
+        })
+    return published["model"], published["pipeline"], published["version"]
+
+
+def attach_bundle(store_dir=DEFAULT_STORE_DIR, prepare=None):
+    """
+    attach() as a hot_reload.ModelBundle, for ModelWatcher. prepare(obj) is applied to the model and pipeline.
+    """
+    from hot_reload import ModelBundle
+
+    model, pipeline, version = attach(store_dir)
+    if prepare is not None:
+        model = prepare(model)
+        pipeline = prepare(pipeline)
+    return ModelBundle(model, pipeline, np.asarray(pipeline.feature_names_in_), version, time.time())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Publish a model into the shared-memory model store.")
+    parser.add_argument("--model", default="xgboost_model.pkl")
+    parser.add_argument("--pipeline", default="preprocessing_pipeline1.pkl")
+    parser.add_argument("--store", default=DEFAULT_STORE_DIR)
+    parser.add_argument("--watch", action="store_true", help="Keep running and republish when the files change")
+    parser.add_argument("--interval", type=float, default=5.0)
+    args = parser.parse_args()
+
+    from hot_reload import artifact_version
+
+    published = None
+    while True:
+        version = artifact_version([args.model, args.pipeline])
+        if version != published:
+            with open(args.model, "rb") as f:
+                model = pickle.load(f)
+            with open(args.pipeline, "rb") as f:
+                pipeline = pickle.load(f)
+            path = publish(model, pipeline, version, args.store)
+            print(f"Published {version} -> {path}")
+            published = version
+        if not args.watch:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import argparse
+import copy
+import pickle
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from features import load_training_frame
+from incremental import build_encoder
+import model_store
+from sparse_batch import build_sparse_encoder
+
+# Parity checks for the fast paths that must give the same output as the original model and pipeline.
+# Run after changing the model, the pipeline or one of the modules below:
+#     python parity_check.py --model xgboost_model.pkl
+# Every check prints one line; the script exits with status 1 when a check fails.
+#   - shared forest: model_store.SharedForest predicts like the native estimators (up to float rounding)
+#   - feature encoder: incremental.FeatureEncoder builds exactly the vectors of pipeline.transform
+#   - sparse batch: sparse_batch.SparseBatchEncoder gives exactly the predictions of the dense output
+
+# SharedForest sums the leaf values in its own order
+SHARED_FOREST_RTOL = 1e-5
+
+
+def check_shared_forest(model, pipeline, X):
+    """
+    Publishes the model to a temporary store and compares the attached model's predictions with the original.
+    """
+    features = pipeline.transform(X)
+    expected = np.asarray(model.predict(features), dtype=np.float64)
+    with tempfile.TemporaryDirectory() as store_dir:
+        # publish() replaces the tree ensembles of the model it gets
+        model_store.publish(copy.deepcopy(model), pipeline, "parity", store_dir)
+        shared_model, _, _ = model_store.attach(store_dir)
+        if not model_store._shared_forests(shared_model):
+            return None, "no tree ensemble to share"
+        actual = np.asarray(shared_model.predict(features), dtype=np.float64)
+    difference = float(np.max(np.abs(actual - expected) / np.abs(expected)))
+    return difference <= SHARED_FOREST_RTOL, f"max relative difference {difference:.2e}"
+
+
+def check_feature_encoder(pipeline, expected_features, X):
+    """
+    Compares transform_row, and update_vector from each row to the next, with pipeline.transform.
+    """
+    encoder = build_encoder(pipeline, expected_features)
+    if encoder is None:
+        return None, "the pipeline has steps the encoder does not support"
+    expected = pipeline.transform(X)
+    rows = X.to_dict("records")
+    built = np.vstack([encoder.transform_row(row) for row in rows])
+    updated = [encoder.transform_row(rows[0])]
+    for previous, row in zip(rows, rows[1:]):
+        updated.append(encoder.update_vector(updated[-1], previous, row)[0])
+    updated = np.vstack(updated)
+    mismatched = int(np.sum(~np.all(built == expected, axis=1)) + np.sum(~np.all(updated == expected, axis=1)))
+    return mismatched == 0, f"{len(rows):,} rows, {mismatched} vector(s) differ"
+
+
+def check_sparse_batch(model, pipeline, X):
+    """
+    Compares the model's predictions on the sparse output with its predictions on the dense output.
+    """
+    encoder = build_sparse_encoder(pipeline, model)
+    if encoder is None:
+        return None, f"{type(model).__name__} keeps the dense output"
+    dense = pipeline.transform(X)
+    matrix = encoder.transform(X)
+    values_differ = not np.array_equal(matrix.toarray(), dense.astype(np.float32))
+    mismatched = int(np.sum(model.predict(matrix) != model.predict(dense)))
+    detail = f"{matrix.nnz / matrix.shape[0]:.0f} of {matrix.shape[1]} columns stored per row, {mismatched} prediction(s) differ"
+    if values_differ:
+        detail += ", the matrices differ"
+    return mismatched == 0 and not values_differ, detail
+
+
+def edge_rows(X):
+    """
+    Rows of X with an unknown category and with missing values, which take the encoders' special cases.
+    """
+    rows = X.iloc[:2].copy()
+    for column in X.columns:
+        if X[column].dtype == object:
+            rows.iloc[0, rows.columns.get_loc(column)] = "Unknown"
+        rows.iloc[1, rows.columns.get_loc(column)] = np.nan
+    return rows
+
+
+def run_checks(checks):
+    """
+    Runs (name, fn, args) checks. Returns True when none failed.
+    """
+    passed = True
+    for name, fn, args in checks:
+        ok, detail = fn(*args)
+        status = "skipped" if ok is None else "ok" if ok else "FAILED"
+        print(f"{name}: {status} ({detail})")
+        passed = passed and ok is not False
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that the fast prediction paths match the original model and pipeline.")
+    parser.add_argument("--model", default="xgboost_model.pkl")
+    parser.add_argument("--pipeline", default="preprocessing_pipeline1.pkl")
+    parser.add_argument("--features", default="expected_features1.pkl")
+    parser.add_argument("--data", default="train.csv", help="Houses to check on (train.csv format)")
+    args = parser.parse_args()
+
+    with open(args.model, "rb") as f:
+        model = pickle.load(f)
+    with open(args.pipeline, "rb") as f:
+        pipeline = pickle.load(f)
+    with open(args.features, "rb") as f:
+        expected_features = pickle.load(f)
+    X, _ = load_training_frame(expected_features, csv_path=args.data, drop_outliers=False)
+    X = pd.concat([X, edge_rows(X)], ignore_index=True)
+
+    passed = run_checks([
+        ("shared forest", check_shared_forest, (model, pipeline, X)),
+        ("feature encoder", check_feature_encoder, (pipeline, expected_features, X)),
+        ("sparse batch", check_sparse_batch, (model, pipeline, X)),
+    ])
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
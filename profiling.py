@@ -0,0 +1,226 @@
+import collections
+import cProfile
+import hashlib
+import hmac
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+
+# On-demand profiling of app reruns.
+# Off by default: a rerun only pays for a couple of dict lookups. Profiling is armed either
+#   - for the whole process with HOUSEPRICE_PROFILE_RUNS=N (the next N reruns of any session), or
+#   - for one session with ?profile=<HOUSEPRICE_PROFILE_TOKEN>&profile_runs=N in the URL
+#     (ignored unless the token is set on the server).
+# A profiled rerun covers the script thread and the inference calls it sends to the thread pool.
+# Mode "sample" (default) writes collapsed stacks (<name>.collapsed, open with speedscope or
+# flamegraph.pl); mode "cprofile" writes <name>.pstats. Each profile gets a <name>.json with
+# the inputs, model version and timing.
+
+ENV_RUNS = "HOUSEPRICE_PROFILE_RUNS"
+ENV_TOKEN = "HOUSEPRICE_PROFILE_TOKEN"
+ENV_DIR = "HOUSEPRICE_PROFILE_DIR"
+ENV_MODE = "HOUSEPRICE_PROFILE_MODE"
+QUERY_TOKEN = "profile"
+QUERY_RUNS = "profile_runs"
+MAX_RUNS = 20
+
+RUNS_KEY = "profile_runs_left"
+ACTIVE_KEY = "active_profiler"
+
+
+class ProfileBudget:
+    """
+    Number of reruns left to profile for the whole process.
+    """
+
+    def __init__(self, runs=None):
+        self.remaining = int(os.environ.get(ENV_RUNS, 0)) if runs is None else runs
+        self._lock = threading.Lock()
+
+    def take(self):
+        if self.remaining <= 0:
+            return False
+        with self._lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+
+def requested_runs(query_params):
+    """
+    Reruns requested through the URL, 0 unless the token matches HOUSEPRICE_PROFILE_TOKEN.
+    """
+    token = os.environ.get(ENV_TOKEN)
+    given = query_params.get(QUERY_TOKEN)
+    if not token or not given or not hmac.compare_digest(str(given), token):
+        return 0
+    try:
+        runs = int(query_params.get(QUERY_RUNS, 1))
+    except ValueError:
+        runs = 1
+    return max(1, min(runs, MAX_RUNS))
+
+
+class RerunProfiler:
+    """
+    Profiles the thread that starts it and every function called through wrap(fn).
+    """
+
+    def __init__(self, mode=None, interval=0.005, directory=None):
+        self.mode = mode or os.environ.get(ENV_MODE, "sample")
+        self.interval = interval
+        self.directory = directory or os.environ.get(ENV_DIR, "profiles")
+        self.tags = {}
+        self.samples = collections.Counter()
+        self._threads = set()
+        self._profiles = []
+        self._stop = threading.Event()
+        self._sampler = None
+        self._main_profile = None
+        self._started = 0.0
+        self._duration = 0.0
+
+    def start(self):
+        self._started = time.perf_counter()
+        if self.mode == "cprofile":
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Python 3.12+ allows one active cProfile per interpreter and another session is
+                # using it: this rerun is sampled instead
+                self.mode = "sample"
+            else:
+                self._main_profile = profile
+                self._profiles.append(profile)
+        if self.mode != "cprofile":
+            self._threads.add(threading.get_ident())
+            self._sampler = threading.Thread(target=self._sample, name="rerun-profiler", daemon=True)
+            self._sampler.start()
+
+    def wrap(self, fn):
+        """
+        fn profiled in whichever thread runs it (e.g. a ThreadBudget worker).
+        """
+        def profiled(*args, **kwargs):
+            if self.mode == "cprofile":
+                profile = cProfile.Profile()
+                try:
+                    profile.enable()
+                except ValueError:
+                    # Python 3.12+ allows one active cProfile per interpreter, which already sees this thread
+                    return fn(*args, **kwargs)
+                self._profiles.append(profile)
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    profile.disable()
+            ident = threading.get_ident()
+            self._threads.add(ident)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._threads.discard(ident)
+        return profiled
+
+    def tag(self, **tags):
+        self.tags.update(tags)
+
+    def stop(self):
+        self._duration = time.perf_counter() - self._started
+        if self._main_profile is not None:
+            self._main_profile.disable()
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+
+    def finish(self, **tags):
+        """
+        Stops profiling and writes the profile. Returns the path of the profile file.
+        """
+        self.stop()
+        self.tag(**tags)
+        os.makedirs(self.directory, exist_ok=True)
+        inputs = json.dumps(self.tags.get("inputs", {}), sort_keys=True, default=str)
+        name = "-".join([
+            "profile",
+            time.strftime("%Y%m%d-%H%M%S"),
+            str(self.tags.get("model_version", "unknown")),
+            hashlib.sha256(inputs.encode()).hexdigest()[:10],
+            f"{os.getpid()}-{id(self) % 10000:04d}",
+        ])
+        base = os.path.join(self.directory, name)
+
+        if self.mode == "cprofile":
+            path = base + ".pstats"
+            stats = pstats.Stats(self._profiles[0])
+            for profile in self._profiles[1:]:
+                stats.add(profile)
+            stats.dump_stats(path)
+        else:
+            path = base + ".collapsed"
+            with open(path, "w") as f:
+                for stack, count in self.samples.most_common():
+                    f.write(f"{stack} {count}\n")
+
+        meta = {
+            **self.tags,
+            "mode": self.mode,
+            "duration_s": round(self._duration, 4),
+            "samples": sum(self.samples.values()),
+            "profile": os.path.basename(path),
+        }
+        with open(base + ".json", "w") as f:
+            json.dump(meta, f, indent=2, default=str)
+        return path
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for ident in list(self._threads):
+                frame = frames.get(ident)
+                if frame is not None:
+                    self.samples[_collapse(frame)] += 1
+
+
+def _collapse(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+def start_rerun_profile(session_state, query_params, budget):
+    """
+    Returns a started RerunProfiler when this rerun is to be profiled, otherwise None.
+    Call profiler.finish(...) at the end of the script and remove ACTIVE_KEY from session_state.
+    """
+    # A rerun that ended early (st.stop) never reached finish()
+    leftover = session_state.pop(ACTIVE_KEY, None)
+    if leftover is not None:
+        leftover.finish(stopped_early=True)
+
+    if QUERY_TOKEN in query_params:
+        runs = requested_runs(query_params)
+        if runs:
+            session_state[RUNS_KEY] = runs
+        # Drop the token from the URL so a page refresh doesn't arm it again
+        for key in (QUERY_TOKEN, QUERY_RUNS):
+            if key in query_params:
+                del query_params[key]
+
+    if session_state.get(RUNS_KEY, 0) > 0:
+        session_state[RUNS_KEY] -= 1
+    elif not budget.take():
+        return None
+
+    profiler = RerunProfiler()
+    session_state[ACTIVE_KEY] = profiler
+    profiler.start()
+    return profiler
@@ -0,0 +1,216 @@
+import collections
+
+import numpy as np
+import pandas as pd
+
+# Renovation optimizer.
+# Every upgrade is a dimension with a few discrete levels (level 0 = leave as is). A plan picks one
+# level per dimension, so the raw search space is the product of the level counts (tens of thousands
+# to millions of plans). The beam search goes through the dimensions one by one: each plan in the
+# beam is extended with every level of the next dimension, plans over budget are dropped before
+# they are scored, all surviving plans are scored in one batched predict, plans that are not worth
+# more than their parent are pruned, and only the beam_width best plans (by price gain minus cost)
+# are kept. Feature vectors of the new plans are built by patching the slots of the changed
+# features (see incremental.FeatureEncoder), not by re-running the preprocessing pipeline.
+
+QUALITY_ORDER = ["Po", "Fa", "TA", "Gd", "Ex"]
+QUALITY_LABELS = {"Po": "Poor", "Fa": "Fair", "TA": "Typical", "Gd": "Good", "Ex": "Excellent"}
+
+# Default costs in dollars (per quality level, per car, per square foot, ...)
+DEFAULT_COSTS = {
+    "KitchenQual": 15000,
+    "ExterQual": 12000,
+    "HeatingQC": 4000,
+    "CentralAir": 6000,
+    "GarageCars": 12000,
+    "BsmtFinSF": 35,
+    "Fireplaces": 5000,
+    "Bathrooms": 15000,
+    "OverallCond": 8000,
+}
+
+COST_LABELS = {
+    "KitchenQual": "Kitchen (per quality level)",
+    "ExterQual": "Exterior (per quality level)",
+    "HeatingQC": "Heating (per quality level)",
+    "CentralAir": "Central air",
+    "GarageCars": "Garage (per car)",
+    "BsmtFinSF": "Basement finishing (per sq ft)",
+    "Fireplaces": "Fireplace (each)",
+    "Bathrooms": "Bathroom (per half bath)",
+    "OverallCond": "Overall condition (per point)",
+}
+
+Option = collections.namedtuple("Option", ["label", "changes", "cost"])
+Dimension = collections.namedtuple("Dimension", ["name", "options"])
+
+
+def _quality_options(features, feature, title, unit_cost):
+    current = features.get(feature)
+    if current not in QUALITY_ORDER:
+        return []
+    start = QUALITY_ORDER.index(current)
+    return [
+        Option(f"{title}: {QUALITY_LABELS[level]}", {feature: level}, (i - start) * unit_cost)
+        for i, level in enumerate(QUALITY_ORDER) if i > start
+    ]
+
+
+def upgrade_dimensions(features, costs=None, basement_steps=10):
+    """
+    The feasible upgrades of a house (a dict of model features), one Dimension per upgrade.
+    Level 0 of every dimension ("no change") is implicit.
+    """
+    costs = {**DEFAULT_COSTS, **(costs or {})}
+    dimensions = [
+        Dimension("KitchenQual", _quality_options(features, "KitchenQual", "Kitchen", costs["KitchenQual"])),
+        Dimension("ExterQual", _quality_options(features, "ExterQual", "Exterior", costs["ExterQual"])),
+        Dimension("HeatingQC", _quality_options(features, "HeatingQC", "Heating", costs["HeatingQC"])),
+    ]
+
+    if features.get("CentralAir") == "N":
+        dimensions.append(Dimension("CentralAir", [Option("Add central air", {"CentralAir": "Y"}, costs["CentralAir"])]))
+
+    cars = int(features.get("GarageCars", 0))
+    garage = []
+    for extra in range(1, min(3, 5 - cars) + 1):
+        changes = {"GarageCars": cars + extra}
+        if features.get("GarageFinish") == "NA":
+            # Building a garage
+            changes["GarageFinish"] = "Unf"
+        garage.append(Option(f"Garage: +{extra} car(s)", changes, extra * costs["GarageCars"]))
+    dimensions.append(Dimension("GarageCars", garage))
+
+    # Finishing the basement moves area from unfinished to finished (TotalSF stays the same)
+    unfinished = int(features.get("BsmtUnfSF", 0))
+    basement = []
+    if unfinished > 0 and features.get("BsmtQual") != "NA":
+        for step in range(1, basement_steps + 1):
+            area = round(unfinished * step / basement_steps)
+            changes = {"BsmtUnfSF": unfinished - area}
+            if features.get("BsmtFinType1") in ("Unf", "NA"):
+                changes["BsmtFinType1"] = "GLQ"
+            basement.append(Option(f"Finish {area:,} sq ft of basement", changes, area * costs["BsmtFinSF"]))
+    dimensions.append(Dimension("BsmtFinSF", basement))
+
+    fireplaces = int(features.get("Fireplaces", 0))
+    fireplace = []
+    for extra in range(1, 3 - fireplaces + 1):
+        changes = {"Fireplaces": fireplaces + extra}
+        if features.get("FireplaceQu") == "NA":
+            changes["FireplaceQu"] = "TA"
+        fireplace.append(Option(f"Add {extra} fireplace(s)", changes, extra * costs["Fireplaces"]))
+    dimensions.append(Dimension("Fireplaces", fireplace))
+
+    bathrooms = float(features.get("TotalBathrooms", 0))
+    dimensions.append(Dimension("Bathrooms", [
+        Option(f"Add {halves * 0.5:g} bathroom(s)", {"TotalBathrooms": bathrooms + halves * 0.5}, halves * costs["Bathrooms"])
+        for halves in range(1, 5)
+    ]))
+
+    condition = int(features.get("OverallCond", 5))
+    dimensions.append(Dimension("OverallCond", [
+        Option(f"Overall condition: {level}", {"OverallCond": level}, (level - condition) * costs["OverallCond"])
+        for level in range(condition + 1, 10)
+    ]))
+    return [dimension for dimension in dimensions if dimension.options]
+
+
+def search_space_size(dimensions):
+    return int(np.prod([len(dimension.options) + 1 for dimension in dimensions], dtype=np.float64))
+
+
+def optimize(features, predict, encoder, costs=None, budget=None, beam_width=64, top_n=10):
+    """
+    Searches upgrade plans for the house described by features (a dict of model features).
+    predict(X) returns prices for a batch of pipeline output vectors, encoder is an incremental.FeatureEncoder.
+    Returns (plans, stats): plans is a DataFrame of the top_n plans by price gain per dollar,
+    stats holds the base price, the size of the search space and the number of plans scored.
+    """
+    dimensions = upgrade_dimensions(features, costs)
+    base_vector = encoder.transform_row(features)
+    base_price = float(predict(base_vector)[0])
+
+    # Slots and encoded values changed by every option
+    patches = []
+    for dimension in dimensions:
+        dimension_patches = []
+        for option in dimension.options:
+            dimension_patches.append([
+                (encoder.slots[feature], encoder.encode(feature, value)) for feature, value in option.changes.items()
+            ])
+        patches.append(dimension_patches)
+
+    # Beam: chosen option per dimension (-1 = no change), vectors, costs and prices
+    choices = np.full((1, len(dimensions)), -1, dtype=np.int16)
+    vectors = base_vector
+    plan_costs = np.zeros(1)
+    prices = np.array([base_price])
+    scored = []
+    n_scored = 0
+
+    for d, dimension in enumerate(dimensions):
+        option_costs = np.array([option.cost for option in dimension.options], dtype=np.float64)
+        n_parents, n_options = len(choices), len(dimension.options)
+
+        # Children of every plan in the beam, one per option of this dimension
+        child_parent = np.repeat(np.arange(n_parents), n_options)
+        child_option = np.tile(np.arange(n_options), n_parents)
+        child_costs = plan_costs[child_parent] + option_costs[child_option]
+        if budget is not None:
+            # Costs only grow further down the tree, so plans over budget are pruned before scoring
+            keep = child_costs <= budget
+            child_parent, child_option, child_costs = child_parent[keep], child_option[keep], child_costs[keep]
+
+        child_vectors = vectors[child_parent].copy()
+        for option_index, option_patches in enumerate(patches[d]):
+            rows = child_option == option_index
+            for slots, value in option_patches:
+                child_vectors[rows, slots] = value
+        child_prices = np.asarray(predict(child_vectors), dtype=np.float64) if len(child_vectors) else np.empty(0)
+        n_scored += len(child_vectors)
+
+        # A child that is not worth more than its parent costs more for nothing: prune it and its subtree
+        keep = child_prices > prices[child_parent]
+        child_parent, child_option, child_costs = child_parent[keep], child_option[keep], child_costs[keep]
+        child_vectors, child_prices = child_vectors[keep], child_prices[keep]
+
+        child_choices = choices[child_parent].copy()
+        child_choices[:, d] = child_option
+        scored.append((child_choices, child_costs, child_prices))
+
+        # Next beam: the parents (plans without this upgrade) and their children, best by net gain
+        choices = np.concatenate([choices, child_choices])
+        vectors = np.concatenate([vectors, child_vectors])
+        plan_costs = np.concatenate([plan_costs, child_costs])
+        prices = np.concatenate([prices, child_prices])
+        net = prices - base_price - plan_costs
+        # The unchanged house stays in the beam so every single upgrade gets scored
+        order = np.argsort(-net[1:], kind="stable")[:beam_width - 1] + 1
+        keep = np.concatenate([[0], order])
+        choices, vectors, plan_costs, prices = choices[keep], vectors[keep], plan_costs[keep], prices[keep]
+
+    if not scored:
+        return pd.DataFrame(columns=["Upgrades", "Cost", "Gain", "GainPerDollar", "Price"]), {
+            "base_price": base_price, "search_space": 1, "scored": 0}
+
+    all_choices = np.concatenate([s[0] for s in scored])
+    all_costs = np.concatenate([s[1] for s in scored])
+    all_prices = np.concatenate([s[2] for s in scored])
+    gains = all_prices - base_price
+    # Free upgrades that raise the price come first
+    ratio = np.where(all_costs > 0, gains / np.maximum(all_costs, 1e-9), np.inf)
+    best = np.argsort(-ratio, kind="stable")
+    best = best[gains[best] > 0][:top_n]
+
+    plans = pd.DataFrame({
+        "Upgrades": [
+            ", ".join(dimensions[d].options[c].label for d, c in enumerate(all_choices[i]) if c >= 0) for i in best
+        ],
+        "Cost": all_costs[best],
+        "Gain": gains[best],
+        "GainPerDollar": ratio[best],
+        "Price": all_prices[best],
+    })
+    stats = {"base_price": base_price, "search_space": search_space_size(dimensions), "scored": n_scored}
+    return plans, stats
@@ -0,0 +1,176 @@
+import copy
+
+import numpy as np
+from scipy import sparse
+from sklearn.ensemble import ExtraTreesRegressor, GradientBoostingRegressor, RandomForestRegressor
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder
+from sklearn.tree import DecisionTreeRegressor
+from xgboost import XGBRegressor
+
+from incremental import column_transformer
+from model_store import _convert_xgboost
+
+# Sparse batch transform.
+# The fitted pipeline one-hot encodes 7 columns into 63 mostly-zero columns of a dense float64
+# matrix. SparseBatchEncoder builds the same matrix as float32 CSR instead: the numeric and ordinal
+# blocks are stored in full, the one-hot block only stores its ones.
+#
+# The result must not change. Tree models compare float32 values anyway, so float32 is safe for
+# them (other estimators are not, and keep the dense path). XGBoost treats an entry that is not
+# stored as missing rather than 0: a split on a one-hot column sends missing values to its default
+# direction, which is not always the direction of 0. Those columns are found in the trees' JSON
+# dump and their zeros are stored explicitly.
+
+TREE_MODELS = (RandomForestRegressor, ExtraTreesRegressor, GradientBoostingRegressor, DecisionTreeRegressor)
+
+
+def _feature_consumers(model):
+    """
+    The estimators that receive the feature matrix itself (not the predictions of other estimators).
+    """
+    if hasattr(model, "best_estimator_"):
+        return _feature_consumers(model.best_estimator_)
+    if hasattr(model, "estimators_") and hasattr(model, "named_estimators_"):
+        # Stacking / voting: the base estimators see the features, the final estimator sees their
+        # predictions (and the features too with passthrough)
+        consumers = [c for estimator in model.estimators_ for c in _feature_consumers(estimator)]
+        if getattr(model, "passthrough", False):
+            consumers.extend(_feature_consumers(model.final_estimator_))
+        return consumers
+    return [model]
+
+
+def unsafe_columns(estimator):
+    """
+    Columns of an XGBoost model where a missing value and a 0 can take different branches.
+    """
+    trees, _, _, _ = _convert_xgboost(estimator)
+    unsafe = set()
+    for tree in trees:
+        split = tree["left"] >= 0
+        zero_left = np.float32(0) < tree["threshold"]
+        mismatch = split & (zero_left != tree["default_left"])
+        unsafe.update(tree["feature"][mismatch].tolist())
+    return unsafe
+
+
+class SparseBatchEncoder:
+    """
+    transform(X) gives the pipeline's output for X as float32 CSR, with the same predictions as the dense output.
+    """
+
+    def __init__(self, pipeline, model):
+        ct = column_transformer(pipeline)
+        blocks = []
+        for name, transformer, columns in ct.transformers_:
+            out = ct.output_indices_[name]
+            if name == "remainder" or transformer == "drop":
+                if out.stop - out.start:
+                    raise ValueError("Remainder columns are not supported")
+                continue
+            last = transformer.steps[-1][1] if isinstance(transformer, Pipeline) else transformer
+            if isinstance(last, OneHotEncoder):
+                if last.drop is not None or getattr(last, "_infrequent_enabled", False) or last.handle_unknown != "ignore":
+                    raise ValueError("OneHotEncoder must keep every category and ignore unknown values")
+                encoder = copy.copy(last)
+                encoder.sparse_output = True
+                encoder.dtype = np.float32
+                before = transformer[:-1] if isinstance(transformer, Pipeline) else None
+                blocks.append((list(columns), out, before, encoder))
+            else:
+                blocks.append((list(columns), out, transformer, None))
+        self.n_outputs = max(out.stop for _, out, _, _ in blocks)
+
+        explicit = np.zeros(self.n_outputs, dtype=bool)
+        for _, out, _, encoder in blocks:
+            if encoder is None:
+                explicit[out] = True
+        for consumer in _feature_consumers(model):
+            if isinstance(consumer, XGBRegressor):
+                if not np.isnan(consumer.missing):
+                    raise ValueError("XGBoost models must use NaN as the missing value")
+                explicit[sorted(unsafe_columns(consumer))] = True
+            elif not isinstance(consumer, TREE_MODELS):
+                raise ValueError(f"{type(consumer).__name__} is not a tree model")
+        # Columns stored for every row (dense blocks and unsafe one-hot columns)
+        self.explicit_columns = np.flatnonzero(explicit)
+
+        # Every row gets the same number of entries: the explicit columns, plus one entry per one-hot
+        # input with its 1, or a 0 in one of its safe columns (a stored 0 is read like a missing one)
+        self.blocks = []
+        self.width = 0
+        for columns, out, transformer, encoder in blocks:
+            if encoder is None:
+                self.blocks.append((columns, out, transformer, None, None))
+                self.width += out.stop - out.start
+                continue
+            inputs = []
+            start = out.start
+            for categories in encoder.categories_:
+                block_columns = np.arange(start, start + len(categories))
+                unsafe = block_columns[explicit[block_columns]]
+                safe = block_columns[~explicit[block_columns]]
+                inputs.append((start, unsafe, safe))
+                self.width += len(unsafe) + (1 if len(safe) else 0)
+                start += len(categories)
+            self.blocks.append((columns, out, transformer, encoder, inputs))
+
+    def transform(self, X):
+        n_rows = len(X)
+        # Every block is encoded (float32 values, int32 one-hot columns) before the output is
+        # allocated, so the output never sits next to the imputers' object arrays
+        encoded = []
+        for columns, out, transformer, encoder, inputs in self.blocks:
+            if encoder is None:
+                encoded.append(np.asarray(transformer.transform(X[columns]), dtype=np.float32))
+                continue
+            values = X[columns] if transformer is None else transformer.transform(X[columns])
+            one_hot = sparse.csr_matrix(encoder.transform(values))
+            del values
+            # Output column of the 1 of every row and input (-1 for unknown categories)
+            hot = np.full((n_rows, len(inputs)), -1, dtype=np.int32)
+            rows = np.repeat(np.arange(n_rows), np.diff(one_hot.indptr))
+            input_of = np.searchsorted([start for start, _, _ in inputs], one_hot.indices + out.start, side="right") - 1
+            hot[rows, input_of] = one_hot.indices + out.start
+            encoded.append(hot)
+
+        data = np.zeros((n_rows, self.width), dtype=np.float32)
+        indices = np.empty((n_rows, self.width), dtype=np.int32)
+        at = 0
+        for (columns, out, transformer, encoder, inputs), values in zip(self.blocks, encoded):
+            if encoder is None:
+                width = out.stop - out.start
+                data[:, at:at + width] = values
+                indices[:, at:at + width] = np.arange(out.start, out.stop)
+                at += width
+                continue
+            for j, (_, unsafe, safe) in enumerate(inputs):
+                width = len(unsafe)
+                data[:, at:at + width] = values[:, j, None] == unsafe
+                indices[:, at:at + width] = unsafe
+                at += width
+                if len(safe):
+                    is_safe = np.isin(values[:, j], safe)
+                    data[:, at] = is_safe
+                    indices[:, at] = np.where(is_safe, values[:, j], safe[0])
+                    at += 1
+        del encoded
+
+        # Built directly (not through scipy operations) so the stored zeros are kept
+        index_type = np.int64 if n_rows * self.width > np.iinfo(np.int32).max else np.int32
+        indptr = np.arange(0, n_rows * self.width + 1, self.width, dtype=index_type)
+        matrix = sparse.csr_matrix((data.ravel(), indices.ravel(), indptr), shape=(n_rows, self.n_outputs))
+        matrix.has_sorted_indices = False
+        matrix.sort_indices()
+        return matrix
+
+
+def build_sparse_encoder(pipeline, model):
+    """
+    SparseBatchEncoder for the pipeline and model, or None when the sparse output could change the predictions.
+    """
+    try:
+        return SparseBatchEncoder(pipeline, model)
+    except (ValueError, TypeError):
+        return None
@@ -0,0 +1,131 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from joblib import parallel_config
+from threadpoolctl import threadpool_limits
+
+# Process-wide thread budget for inference.
+# Every session sends its pipeline.transform / model.predict work to one bounded worker pool,
+# and every call is limited to threads_per_call threads, so workers x threads_per_call <= cores.
+# Requests beyond the pool wait in a bounded queue; when the queue is full callers are rejected.
+
+# Environment variables (all optional)
+#   HOUSEPRICE_THREADS            total threads for inference (default: number of cores)
+#   HOUSEPRICE_THREADS_PER_CALL   threads used by one transform/predict call (default: 1)
+#   HOUSEPRICE_MAX_QUEUE          requests allowed to wait for a worker (default: 4 x workers)
+#   HOUSEPRICE_QUEUE_TIMEOUT      seconds a request waits for a queue slot before being rejected (default: 10)
+
+
+class InferenceBusy(RuntimeError):
+    """
+    Raised when the inference queue is full.
+    """
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+class ThreadBudget:
+    def __init__(self, total_threads=None, threads_per_call=None, max_queue=None, queue_timeout=None):
+        self.total_threads = total_threads or _env_int("HOUSEPRICE_THREADS", os.cpu_count() or 1)
+        self.threads_per_call = max(1, threads_per_call or _env_int("HOUSEPRICE_THREADS_PER_CALL", 1))
+        self.threads_per_call = min(self.threads_per_call, self.total_threads)
+        self.workers = max(1, self.total_threads // self.threads_per_call)
+        self.max_queue = max_queue if max_queue is not None else _env_int("HOUSEPRICE_MAX_QUEUE", 4 * self.workers)
+        if queue_timeout is None:
+            queue_timeout = float(os.environ.get("HOUSEPRICE_QUEUE_TIMEOUT") or 10)
+        self.queue_timeout = queue_timeout
+
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+        # One slot per running or waiting request: this is the backpressure
+        self._slots = threading.BoundedSemaphore(self.workers + self.max_queue)
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._running = 0
+        self._rejected = 0
+        self._completed = 0
+        self._waits = deque(maxlen=1000)
+
+        # BLAS / OpenMP pools are process wide, so they are capped once instead of per call
+        threadpool_limits(limits=self.threads_per_call)
+
+    def run(self, fn, *args, **kwargs):
+        """
+        Runs fn(*args, **kwargs) on the worker pool and returns its result.
+        Raises InferenceBusy when no queue slot frees up within queue_timeout seconds.
+        """
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            with self._lock:
+                self._rejected += 1
+            raise InferenceBusy("Too many valuation requests at the moment, please try again.")
+
+        submitted = time.perf_counter()
+        with self._lock:
+            self._waiting += 1
+
+        def task():
+            started = time.perf_counter()
+            with self._lock:
+                self._waiting -= 1
+                self._running += 1
+                self._waits.append(started - submitted)
+            try:
+                # joblib (ColumnTransformer) runs in threads inside the worker instead of spawning processes
+                with parallel_config(backend="threading", n_jobs=self.threads_per_call):
+                    return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._completed += 1
+                self._slots.release()
+
+        return self._executor.submit(task).result()
+
+    def stats(self):
+        """
+        Current queue depth and recent wait times (milliseconds).
+        """
+        with self._lock:
+            waits = np.array(self._waits) * 1000
+            return {
+                "workers": self.workers,
+                "threads_per_call": self.threads_per_call,
+                "queue_depth": self._waiting,
+                "running": self._running,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "mean_wait_ms": float(waits.mean()) if len(waits) else 0.0,
+                "p95_wait_ms": float(np.percentile(waits, 95)) if len(waits) else 0.0,
+                "max_wait_ms": float(waits.max()) if len(waits) else 0.0,
+            }
+
+
+def _sub_estimators(estimator):
+    # Fitted estimators nested in search, ensemble, pipeline and column transformer objects
+    for attr in ("best_estimator_", "final_estimator_", "estimators_", "steps", "transformers_"):
+        value = getattr(estimator, attr, None)
+        if value is None or isinstance(value, np.ndarray):
+            continue
+        items = value if isinstance(value, (list, tuple)) else [value]
+        for item in items:
+            parts = item if isinstance(item, tuple) else (item,)
+            for part in parts:
+                if hasattr(part, "get_params"):
+                    yield part
+
+
+def set_thread_count(estimator, threads):
+    """
+    Sets n_jobs (XGBoost's nthread) on an estimator and on every estimator nested inside it.
+    """
+    if "n_jobs" in estimator.get_params(deep=False):
+        estimator.set_params(n_jobs=threads)
+    for sub in _sub_estimators(estimator):
+        set_thread_count(sub, threads)
+    return estimator
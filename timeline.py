@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+from scipy.stats import percentileofscore
+
+# Valuation of the same houses across sale years.
+# The model sees the sale year only through HouseAge (YrSold - YearBuilt) and HouseRemodelAge
+# (YrSold - YearRemodAdd). Every year variant of every house is one row of a single matrix, so a
+# whole timeline (or a whole chunk of a portfolio times all years) costs one transform and one predict.
+
+
+def parse_years(text):
+    """
+    "2006:2015" -> [2006, ..., 2015], "2008,2010" -> [2008, 2010].
+    """
+    if ":" in text:
+        first, last = (int(part) for part in text.split(":"))
+        return list(range(first, last + 1))
+    return [int(part) for part in text.split(",")]
+
+
+def year_variants(X, base_years, years):
+    """
+    Repeats every row of X (model features valued as of base_years, a scalar or one year per row)
+    once per year and shifts HouseAge and HouseRemodelAge to that sale year.
+    Returns (variants, built): rows are ordered house by house, built is False where the house
+    did not exist yet in that year.
+    """
+    years = np.asarray(years)
+    n_rows, n_years = len(X), len(years)
+    delta = (years[None, :] - np.broadcast_to(np.asarray(base_years), (n_rows,))[:, None]).ravel()
+
+    variants = X.iloc[np.repeat(np.arange(n_rows), n_years)].reset_index(drop=True)
+    house_age = np.repeat(X["HouseAge"].to_numpy(dtype=np.float64), n_years) + delta
+    remodel_age = np.repeat(X["HouseRemodelAge"].to_numpy(dtype=np.float64), n_years) + delta
+    # Before the remodel, the remodel year is the year built (as in the Kaggle data)
+    variants["HouseAge"] = house_age
+    variants["HouseRemodelAge"] = np.where(remodel_age >= 0, remodel_age, house_age)
+    return variants, (house_age >= 0).reshape(n_rows, n_years)
+
+
+def value_over_years(X, pipeline, model, years, base_years):
+    """
+    Predicted prices of every row of X in every year, shape (len(X), len(years)).
+    Years before the house was built are NaN. One transform and one predict for all variants.
+    """
+    variants, built = year_variants(X, base_years, years)
+    prices = np.asarray(model.predict(pipeline.transform(variants)), dtype=np.float64).reshape(built.shape)
+    prices[~built] = np.nan
+    return prices
+
+
+def year_percentiles(prices, years, reference):
+    """
+    Percentile (same kind as the price ranking) of each price against the sales of its year in reference
+    (a frame with SalePrice and YrSold).
+    NaN for years without reference sales.
+    """
+    sales = {int(year): group.to_numpy() for year, group in pd.Series(reference["SalePrice"]).groupby(np.asarray(reference["YrSold"]))}
+    return np.array([
+        percentileofscore(sales[year], price, kind="weak") if year in sales and not np.isnan(price) else np.nan
+        for price, year in zip(prices, years)
+    ])
@@ -0,0 +1,242 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+
+# Declarative input validation shared by the app and batch scoring.
+# Every rule is a vectorized check over whole columns of a DataFrame that uses the original
+# Kaggle column names (train.csv format). Rules whose columns are not in the frame are skipped,
+# so the same schema works for one app row and for millions of uploaded rows.
+# SCHEMA holds the rules every house must pass (batch scoring uses it). APP_SCHEMA adds the
+# ranges of the app's widgets, which are limits of the UI, not of the data: train.csv itself
+# has houses outside them.
+
+# Allowed MSSubClass per HouseStyle
+HOUSE_STYLE_TO_SUBCLASS = {
+    "1Story": [20, 30, 40, 90, 120, 190],
+    "1.5Fin": [30, 50, 90, 190],
+    "1.5Unf": [30, 45, 190],
+    "2Story": [20, 50, 60, 70, 75, 90, 160, 190],
+    "2.5Fin": [70, 75, 190],
+    "2.5Unf": [75, 190],
+    "SFoyer": [85, 90, 120, 180],
+    "SLvl": [20, 60, 80, 90, 180, 190],
+}
+
+QUALITY = ["Ex", "Gd", "TA", "Fa", "Po"]
+BASEMENT_COLUMNS = ["BsmtQual", "BsmtExposure", "BsmtFinType1"]
+PORCH_COLUMNS = ["WoodDeckSF", "OpenPorchSF", "EnclosedPorch", "3SsnPorch", "ScreenPorch"]
+MAX_PORCH_TYPES = 3
+# "NA" (as sent by the app) and empty values both mean "feature not present"
+MISSING_VALUES = ["NA"]
+
+
+def is_missing(series):
+    return series.isna() | series.isin(MISSING_VALUES)
+
+
+class Rule:
+    """
+    check(df) returns a boolean array that is True for the valid rows.
+    The rule only runs when all of its columns are present.
+    """
+
+    def __init__(self, name, columns, check, message):
+        self.name = name
+        self.columns = columns
+        self.check = check
+        self.message = message
+
+    def applies_to(self, df):
+        return all(col in df.columns for col in self.columns)
+
+
+def range_rule(column, low, high=None, name=None):
+    # Missing numbers are left to the pipeline's imputer
+    if high is None:
+        return Rule(
+            name or f"{column}_range", [column],
+            lambda df: df[column].isna().to_numpy() | (df[column] >= low).to_numpy(),
+            f"{column} must be at least {low:,}",
+        )
+    return Rule(
+        name or f"{column}_range", [column],
+        lambda df: df[column].isna().to_numpy() | df[column].between(low, high).to_numpy(),
+        f"{column} must be between {low:,} and {high:,}",
+    )
+
+
+def one_of_rule(column, values, allow_missing=False):
+    def check(df):
+        valid = df[column].isin(values).to_numpy()
+        if allow_missing:
+            valid = valid | is_missing(df[column]).to_numpy()
+        return valid
+
+    return Rule(f"{column}_values", [column], check, f"{column} must be one of {', '.join(map(str, values))}")
+
+
+def _house_style_subclass(df):
+    allowed = pd.MultiIndex.from_tuples(
+        [(style, subclass) for style, subclasses in HOUSE_STYLE_TO_SUBCLASS.items() for subclass in subclasses]
+    )
+    pairs = pd.MultiIndex.from_arrays([df["HouseStyle"], df["MSSubClass"]])
+    return pairs.isin(allowed)
+
+
+def _no_basement_fields(df):
+    # Without a basement the basement ratings must be "No Basement"
+    has_basement = df["TotalBsmtSF"].fillna(0).to_numpy() > 0
+    missing = np.column_stack([is_missing(df[col]).to_numpy() for col in BASEMENT_COLUMNS])
+    return has_basement | missing.all(axis=1)
+
+
+def _basement_fields_present(df):
+    has_basement = df["TotalBsmtSF"].fillna(0).to_numpy() > 0
+    return ~has_basement | ~is_missing(df["BsmtQual"]).to_numpy()
+
+
+def _garage_cars(df):
+    return ~is_missing(df["GarageFinish"]).to_numpy() | (df["GarageCars"].fillna(0).to_numpy() == 0)
+
+
+def _fireplaces(df):
+    return ~is_missing(df["FireplaceQu"]).to_numpy() | (df["Fireplaces"].fillna(0).to_numpy() == 0)
+
+
+def _first_floor(df):
+    return df["1stFlrSF"].to_numpy() <= df["GrLivArea"].to_numpy()
+
+
+def _finished_basement(df):
+    finished = df["BsmtFinSF1"].fillna(0).to_numpy() + df["BsmtFinSF2"].fillna(0).to_numpy()
+    return finished <= df["TotalBsmtSF"].fillna(0).to_numpy()
+
+
+def _porch_count(df):
+    return (df[PORCH_COLUMNS].fillna(0).to_numpy() > 0).sum(axis=1) <= MAX_PORCH_TYPES
+
+
+def _remodel_after_built(df):
+    return df["YearRemodAdd"].to_numpy() >= df["YearBuilt"].to_numpy()
+
+
+def build_schema(current_year=None):
+    """
+    The input schema: valid ranges of the data, allowed categories and cross-field constraints.
+    """
+    current_year = current_year or datetime.datetime.now().year
+    return [
+        # Ranges
+        *[range_rule(col, 0) for col in [
+            "GrLivArea", "1stFlrSF", "2ndFlrSF", "TotalBsmtSF", "BsmtFinSF1", "BsmtFinSF2", "BsmtUnfSF",
+            "FullBath", "HalfBath", "BsmtFullBath", "BsmtHalfBath", "GarageCars", "BedroomAbvGr",
+            "TotRmsAbvGrd", "KitchenAbvGr", "Fireplaces", "MasVnrArea", "LotFrontage", "LotArea", "PoolArea",
+            *PORCH_COLUMNS,
+        ]],
+        range_rule("OverallQual", 1, 10),
+        range_rule("OverallCond", 1, 10),
+        range_rule("YearBuilt", 1800, current_year),
+        range_rule("YearRemodAdd", 1800, current_year),
+        # Categories
+        one_of_rule("HouseStyle", list(HOUSE_STYLE_TO_SUBCLASS)),
+        one_of_rule("MSZoning", ["A", "C", "C (all)", "FV", "I", "RH", "RL", "RP", "RM"]),
+        one_of_rule("ExterQual", QUALITY),
+        one_of_rule("KitchenQual", QUALITY),
+        one_of_rule("HeatingQC", QUALITY),
+        one_of_rule("BsmtQual", QUALITY, allow_missing=True),
+        one_of_rule("FireplaceQu", QUALITY, allow_missing=True),
+        one_of_rule("BsmtExposure", ["Gd", "Av", "Mn", "No"], allow_missing=True),
+        one_of_rule("BsmtFinType1", ["GLQ", "ALQ", "BLQ", "Rec", "LwQ", "Unf"], allow_missing=True),
+        one_of_rule("GarageFinish", ["Fin", "RFn", "Unf"], allow_missing=True),
+        one_of_rule("Functional", ["Typ", "Min1", "Min2", "Mod", "Maj1", "Maj2", "Sev", "Sal"]),
+        one_of_rule("Heating", ["Floor", "GasA", "GasW", "Grav", "OthW", "Wall"]),
+        one_of_rule("CentralAir", ["Y", "N"]),
+        one_of_rule("MasVnrType", ["BrkCmn", "BrkFace", "CBlock", "Stone", "None"], allow_missing=True),
+        # Cross-field constraints
+        Rule("house_style_subclass", ["HouseStyle", "MSSubClass"], _house_style_subclass,
+             "Property type (MSSubClass) is not valid for this house style"),
+        Rule("no_basement_fields", ["TotalBsmtSF", *BASEMENT_COLUMNS], _no_basement_fields,
+             "Basement ratings must be 'No Basement' when Total Basement Area is 0"),
+        Rule("basement_fields_present", ["TotalBsmtSF", "BsmtQual"], _basement_fields_present,
+             "Basement height cannot be 'No Basement' when there is a basement"),
+        Rule("garage_cars", ["GarageFinish", "GarageCars"], _garage_cars,
+             "Garage car capacity must be 0 when there is no garage"),
+        Rule("fireplaces", ["FireplaceQu", "Fireplaces"], _fireplaces,
+             "Number of fireplaces must be 0 when there is no fireplace"),
+        Rule("first_floor", ["1stFlrSF", "GrLivArea"], _first_floor,
+             "First floor area cannot be larger than the living area"),
+        Rule("finished_basement", ["BsmtFinSF1", "BsmtFinSF2", "TotalBsmtSF"], _finished_basement,
+             "Finished basement area cannot be larger than the total basement area"),
+        Rule("porch_count", PORCH_COLUMNS, _porch_count,
+             f"At most {MAX_PORCH_TYPES} porch types can be selected"),
+        Rule("remodel_after_built", ["YearBuilt", "YearRemodAdd"], _remodel_after_built,
+             "Year of remodeling cannot be before the year built"),
+    ]
+
+
+def build_app_limits(current_year=None):
+    """
+    Ranges of the app's widgets. The app checks them on top of the schema; batch scoring does not.
+    """
+    current_year = current_year or datetime.datetime.now().year
+    limits = [
+        ("GrLivArea", 100, 10000), ("1stFlrSF", 100, 10000), ("TotalBsmtSF", 0, 7500),
+        ("FullBath", 0, 3), ("HalfBath", 0, 2), ("BsmtFullBath", 0, 3), ("BsmtHalfBath", 0, 2),
+        ("GarageCars", 0, 5), ("BedroomAbvGr", 0, 8), ("TotRmsAbvGrd", 2, 14), ("KitchenAbvGr", 0, 3),
+        ("Fireplaces", 0, 3), ("MasVnrArea", 0, 1500), ("LotFrontage", 0, 200), ("LotArea", 0, 55000),
+        ("PoolArea", 0, 750), *[(col, 0, 1000) for col in PORCH_COLUMNS],
+    ]
+    return [range_rule(col, low, high, name=f"{col}_app_range") for col, low, high in limits]
+
+
+SCHEMA = build_schema()
+APP_SCHEMA = SCHEMA + build_app_limits()
+
+
+class ValidationResult:
+    """
+    errors: boolean DataFrame (one column per applied rule), True where a row breaks the rule.
+    valid: boolean array, True for the rows that pass every rule.
+    """
+
+    def __init__(self, errors, messages):
+        self.errors = errors
+        self.messages = messages
+        self.valid = ~errors.to_numpy().any(axis=1) if errors.shape[1] else np.ones(len(errors), dtype=bool)
+
+    @property
+    def n_invalid(self):
+        return int((~self.valid).sum())
+
+    def reasons(self, separator="; "):
+        """
+        Error messages of every row ("" for valid rows). Only the failing rows are formatted.
+        """
+        reasons = pd.Series("", index=self.errors.index, dtype=object)
+        for rule_name in self.errors.columns[self.errors.any(axis=0).to_numpy()]:
+            failed = self.errors[rule_name].to_numpy()
+            prefix = np.where(reasons[failed] == "", "", separator)
+            reasons[failed] = reasons[failed] + prefix + self.messages[rule_name]
+        return reasons
+
+
+def select_rules(columns, schema=SCHEMA):
+    """
+    The rules that read any of the given columns (the rules to check again after those inputs changed).
+    """
+    columns = set(columns)
+    return [rule for rule in schema if columns.intersection(rule.columns)]
+
+
+def validate(df, schema=SCHEMA):
+    """
+    Evaluates every applicable rule of the schema over the whole frame.
+    """
+    errors = {}
+    messages = {}
+    for rule in schema:
+        if rule.applies_to(df):
+            errors[rule.name] = ~np.asarray(rule.check(df), dtype=bool)
+            messages[rule.name] = rule.message
+    return ValidationResult(pd.DataFrame(errors, index=df.index), messages)